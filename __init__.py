@@ -43,9 +43,11 @@ def register():
     ui.register_classes()
 
     preset_handler.install_presets()
+    preset_handler.start_preset_watch()
 
 
 def unregister():
+    preset_handler.stop_preset_watch()
     ui.unregister_classes()
     operators.unregister_classes()
     preferences.unregister_classes()
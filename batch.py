@@ -0,0 +1,477 @@
+"""Process many characters in background Blender sessions.
+
+Usage:
+    blender -b --python batch.py -- extract --preset Mixamo.py --output OUT_DIR FILE_OR_DIR [...]
+    blender -b --python batch.py -- lint --output OUT_DIR FILE_OR_DIR [...]
+    python batch.py --blender /path/to/blender extract --preset Mixamo.py --output OUT_DIR FILE_OR_DIR [...]
+
+.blend and .fbx files are split among background Blender workers.
+
+extract: each worker resolves the preset once, or detects the best matching preset of each character
+when --preset is AUTO. Then it opens every file of its share, runs Extract Metarig on the main armature
+and saves the result to OUT_DIR/<file>.blend, along with OUT_DIR/<file>.json reporting the preset bones
+missing in that character, where <file> is the path of the character relative to the input directories,
+extension included, i.e. OUT_DIR/heroes/hero.fbx.json. A summary of all characters is written to OUT_DIR/report.json
+
+lint: each worker reads the bone names of its characters without importing them, then checks the presets
+given with --preset, or those matching each character, against those names. The missing preset bones
+and the bones left out by each preset are written to OUT_DIR/lint.json, and their counts to OUT_DIR/lint.csv
+as a matrix of characters and presets, with "missing/extra" cells
+"""
+
+import argparse
+import csv
+import importlib
+import json
+import os
+import subprocess
+import sys
+import traceback
+
+
+CHARACTER_EXTENSIONS = ('.blend', '.fbx')
+REPORT_NAME = "report.json"
+LINT_NAME = "lint"
+AUTO_PRESET = "AUTO"
+
+
+def parse_args(argv):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('paths', nargs='+', help=".blend/.fbx files, or directories containing them")
+    common.add_argument('--output', required=True, help="directory for output files and reports")
+    common.add_argument('--armature', default="", help="name of the armature, defaults to the one with most bones")
+    common.add_argument('--jobs', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="number of Blender workers")
+    common.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    common.add_argument('--root', default="", help=argparse.SUPPRESS)
+
+    parser = argparse.ArgumentParser(description="Process characters in background Blender sessions")
+    parser.add_argument('--blender', default="", help="path to the Blender executable")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    extract = commands.add_parser('extract', parents=[common], help="extract Rigify metarigs")
+    extract.add_argument('--preset', required=True, help="retarget preset of the characters, i.e. Mixamo.py,"
+                                                        f" or {AUTO_PRESET} to detect it for each character")
+    extract.add_argument('--keep-face', action='store_true', help="keep face bones in the metarig")
+
+    lint = commands.add_parser('lint', parents=[common], help="check presets against the bones of the characters")
+    lint.add_argument('--preset', action='append', default=[],
+                      help="preset to check, can be repeated. Defaults to the presets matching each character")
+    lint.add_argument('--min-score', type=float, default=0.5,
+                      help="fraction of preset bones found in a character for the preset to be checked")
+
+    return parser.parse_args(argv)
+
+
+def script_args():
+    """Return the arguments meant for this script, those after '--' when running in Blender"""
+    if '--' in sys.argv:
+        return sys.argv[sys.argv.index('--') + 1:]
+    if 'bpy' in sys.modules:
+        return []
+    return sys.argv[1:]
+
+
+def iterate_character_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for f in sorted(os.listdir(path)):
+                if f.lower().endswith(CHARACTER_EXTENSIONS):
+                    yield os.path.join(path, f)
+        elif path.lower().endswith(CHARACTER_EXTENSIONS):
+            yield path
+
+
+def get_input_root(files):
+    """Return the directory containing all the files, their outputs are named after their path from there"""
+    return os.path.commonpath([os.path.dirname(f) for f in files])
+
+
+def output_path(output_dir, filepath, root, extension):
+    """Return the output of a character file, named after its path relative to root, extension included,
+    so that files with the same name in different directories or of different types don't overwrite each other"""
+    return os.path.join(output_dir, os.path.relpath(filepath, root) + extension)
+
+
+def report_path(output_dir, filepath, root):
+    return output_path(output_dir, filepath, root, ".json")
+
+
+# Driver
+
+def find_blender(args):
+    if args.blender:
+        return args.blender
+    try:
+        import bpy
+    except ImportError:
+        sys.exit("Blender executable not found: run inside Blender, or pass --blender")
+    return bpy.app.binary_path
+
+
+def run_workers(args, options, files, root):
+    """Run the background workers on files, wait for all of them to finish.
+
+    Return {file: exit code} of the files given to workers that failed
+    """
+    blender = find_blender(args)
+
+    # round robin, so that each worker gets a mix of heavy and light files
+    num_jobs = max(1, min(args.jobs, len(files)))
+    workers = []
+    for i in range(num_jobs):
+        command = [blender, '-b', '--factory-startup', '--python', os.path.abspath(__file__),
+                   '--', args.command, '--worker', '--root', root] + options + files[i::num_jobs]
+        workers.append((files[i::num_jobs], subprocess.Popen(command)))
+
+    failed = {}
+    for worker_files, worker in workers:
+        if worker.wait() != 0:
+            print(f"Expy Kit: worker failed with exit code {worker.returncode}"
+                  f" on {len(worker_files)} files", file=sys.stderr)
+            failed.update(dict.fromkeys(worker_files, worker.returncode))
+
+    return failed
+
+
+def clear_reports(output_dir, files, root):
+    """Remove the reports of files left by previous runs, which would be taken for those of workers that failed"""
+    for filepath in files:
+        path = report_path(output_dir, filepath, root)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def collect_reports(output_dir, files, root, failed):
+    reports = []
+    for filepath in files:
+        try:
+            with open(report_path(output_dir, filepath, root)) as report_file:
+                reports.append(json.load(report_file))
+        except (OSError, ValueError):
+            if filepath in failed:
+                error = f"worker exited with code {failed[filepath]}"
+            else:
+                error = "worker did not report"
+            reports.append({'file': filepath, 'error': error})
+
+    return reports
+
+
+def run_driver(args):
+    files = list(dict.fromkeys(os.path.abspath(f) for f in iterate_character_files(args.paths)))
+    if not files:
+        sys.exit("No .blend/.fbx files found")
+
+    output_dir = os.path.abspath(args.output)
+    os.makedirs(output_dir, exist_ok=True)
+    root = get_input_root(files)
+    clear_reports(output_dir, files, root)
+
+    options = ['--output', output_dir]
+    if args.armature:
+        options += ['--armature', args.armature]
+
+    if args.command == 'lint':
+        for preset in args.preset:
+            options += ['--preset', preset]
+        options += ['--min-score', str(args.min_score)]
+
+        failed = run_workers(args, options, files, root)
+        return write_lint_summary(output_dir, collect_reports(output_dir, files, root, failed))
+
+    options += ['--preset', args.preset]
+    if args.keep_face:
+        options.append('--keep-face')
+
+    failed = run_workers(args, options, files, root)
+    characters = collect_reports(output_dir, files, root, failed)
+
+    with open(os.path.join(output_dir, REPORT_NAME), 'w') as report_file:
+        json.dump({'preset': args.preset, 'characters': characters}, report_file, indent=2)
+
+    failed = [c['file'] for c in characters if c.get('error')]
+    incomplete = [c['file'] for c in characters if c.get('missing')]
+    print(f"Expy Kit: {len(files) - len(failed)}/{len(files)} metarigs extracted,"
+          f" {len(incomplete)} with missing bones, see {os.path.join(output_dir, REPORT_NAME)}")
+
+    return 1 if failed else 0
+
+
+def write_lint_summary(output_dir, characters):
+    """Write the lint reports of all characters, and the matrix of missing/extra bones of each preset"""
+    json_path = os.path.join(output_dir, LINT_NAME + ".json")
+    with open(json_path, 'w') as report_file:
+        json.dump({'characters': characters}, report_file, indent=2)
+
+    presets = sorted({preset for c in characters for preset in c.get('presets', ())})
+    csv_path = os.path.join(output_dir, LINT_NAME + ".csv")
+    with open(csv_path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['file', 'bones', 'error'] + presets)
+        for character in characters:
+            results = character.get('presets', {})
+            row = [character['file'], character.get('bones', ""), character.get('error', "").strip().split('\n')[-1]]
+            for preset in presets:
+                result = results.get(preset)
+                if not result:
+                    row.append("")
+                elif result.get('error'):
+                    row.append("error")
+                else:
+                    row.append(f"{len(result['missing'])}/{len(result['extra'])}")
+            writer.writerow(row)
+
+    failed = [c['file'] for c in characters if c.get('error')]
+    drifted = {preset for c in characters for preset, result in c.get('presets', {}).items() if result['missing']}
+    print(f"Expy Kit: {len(characters) - len(failed)}/{len(characters)} characters checked,"
+          f" {len(drifted)}/{len(presets)} presets with missing bones, see {csv_path}")
+
+    return 1 if failed else 0
+
+
+# Worker
+
+def import_expykit():
+    """Return the Expy Kit package, enabling it with rigify if needed"""
+    import addon_utils
+
+    addon_utils.enable('rigify', default_set=True)
+
+    addon_dir = os.path.dirname(os.path.realpath(__file__))
+    for module in addon_utils.modules():
+        if os.path.dirname(os.path.realpath(module.__file__)) == addon_dir:
+            addon_utils.enable(module.__name__, default_set=True)
+            return sys.modules[module.__name__]
+
+    # not installed: import the package from its location
+    sys.path.append(os.path.dirname(addon_dir))
+    package = importlib.import_module(os.path.basename(addon_dir))
+    package.register()
+    return package
+
+
+def iterate_slots(skeleton):
+    """Yield (slot path, bone name) of the bones set in a preset skeleton"""
+    for group in ('spine', 'left_arm', 'left_arm_ik', 'right_arm', 'right_arm_ik',
+                  'right_leg', 'right_leg_ik', 'left_leg', 'left_leg_ik', 'face'):
+        limb = getattr(skeleton, group)
+        if group.endswith('_ik') and limb is getattr(skeleton, group[:-3]):
+            # no IK bones in preset, FK bones are used instead
+            continue
+
+        for k, v in limb.items():
+            if k != 'name' and v and isinstance(v, str):
+                yield f"{group}.{k}", v
+
+    for group in ('left_fingers', 'right_fingers'):
+        for k, finger in getattr(skeleton, group).items():
+            for slot, bone_name in zip(('a', 'b', 'c', 'meta'), finger):
+                if bone_name:
+                    yield f"{group}.{k}.{slot}", bone_name
+
+    if skeleton.custom:
+        if skeleton.custom.name:
+            yield 'custom.name', skeleton.custom.name
+        for identifier, bone_name in skeleton.custom.get_bones():
+            yield f"custom.bones.{identifier}", bone_name
+
+    if skeleton.root:
+        yield 'root', skeleton.root
+
+
+def get_setting(settings, path):
+    if path.startswith('custom.bones.'):
+        return dict(settings.custom.get_bones()).get(path[len('custom.bones.'):], "")
+
+    for attr in path.split('.'):
+        settings = getattr(settings, attr)
+    return settings
+
+
+def load_character(filepath):
+    import bpy
+
+    if filepath.lower().endswith('.blend'):
+        bpy.ops.wm.open_mainfile(filepath=filepath, load_ui=False)
+    else:
+        bpy.ops.wm.read_homefile(use_empty=True)
+        bpy.ops.import_scene.fbx(filepath=filepath)
+
+
+def find_armature(armature_name=""):
+    import bpy
+
+    if armature_name:
+        return bpy.data.objects.get(armature_name)
+
+    armatures = [ob for ob in bpy.context.scene.objects if ob.type == 'ARMATURE'
+                 and not getattr(ob.data, 'rigify_target_rig', None)]
+    return max(armatures, key=lambda ob: len(ob.data.bones), default=None)
+
+
+def extract_character(expykit, filepath, preset_skels, args):
+    import bpy
+
+    preset = args.preset
+    report = {'file': filepath, 'preset': preset, 'armature': "", 'output': "", 'missing': {}, 'error': ""}
+
+    load_character(filepath)
+    armature_ob = find_armature(args.armature)
+    if not armature_ob:
+        report['error'] = "armature not found"
+        return report
+    report['armature'] = armature_ob.name
+
+    if bpy.context.object and bpy.context.object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.context.view_layer.objects.active = armature_ob
+    armature_ob.select_set(True)
+    bpy.ops.object.mode_set(mode='POSE')
+
+    if preset == AUTO_PRESET:
+        preset = expykit.preset_handler.detect_preset(armature_ob.data)
+        if not preset:
+            report['error'] = "no matching preset"
+            return report
+        report['preset'] = preset
+
+    # presets are resolved only once for all the characters of this worker
+    try:
+        preset_skel = preset_skels[preset]
+    except KeyError:
+        preset_skel = preset_skels[preset] = expykit.preset_handler.get_preset_skel(preset)
+
+    # apply the preset to the armature, bones not found in the armature are cleared by validation
+    expykit.preset_handler.set_preset_skel(preset)
+    settings = armature_ob.data.expykit_retarget
+    report['missing'] = {path: bone_name for path, bone_name in iterate_slots(preset_skel)
+                         if not get_setting(settings, path)}
+
+    # the preset was applied already, extract from current settings
+    result = bpy.ops.object.expykit_extract_metarig(rig_preset="--Current--", no_face=not args.keep_face)
+    if 'FINISHED' not in result:
+        report['error'] = "metarig extraction failed"
+        return report
+
+    bpy.ops.object.mode_set(mode='OBJECT')
+    metarig_path = output_path(args.output, filepath, args.root, ".blend")
+    bpy.ops.wm.save_as_mainfile(filepath=metarig_path, copy=True)
+    report['output'] = metarig_path
+
+    return report
+
+
+def read_bone_names(expykit, filepath, armature_name=""):
+    """Return the bone names of the main armature of a character, without loading the rest of the file"""
+    import bpy
+
+    if filepath.lower().endswith('.fbx'):
+        fbx_helper = importlib.import_module(expykit.__name__ + '.fbx_helper')
+        bone_names = fbx_helper.get_fbx_bone_names(filepath)
+        if bone_names is None:
+            raise ValueError("not a binary FBX file")
+        return bone_names
+
+    # link the armature data only: objects, meshes and images are not loaded
+    with bpy.data.libraries.load(filepath, link=True) as (data_from, data_to):
+        data_to.armatures = [armature_name] if armature_name else list(data_from.armatures)
+
+    armatures = [arm for arm in data_to.armatures if arm and not getattr(arm, 'rigify_target_rig', None)]
+    main_armature = max(armatures, key=lambda arm: len(arm.bones), default=None)
+    bone_names = [bone.name for bone in main_armature.bones] if main_armature else None
+
+    bpy.data.batch_remove([arm for arm in data_to.armatures if arm])
+    for library in list(bpy.data.libraries):
+        bpy.data.libraries.remove(library)
+
+    if bone_names is None:
+        raise ValueError("armature not found")
+    return bone_names
+
+
+def lint_character(expykit, filepath, args):
+    preset_handler = expykit.preset_handler
+    bone_mapping = importlib.import_module(expykit.__name__ + '.rig_mapping.bone_mapping')
+
+    report = {'file': filepath, 'bones': 0, 'presets': {}, 'error': ""}
+
+    bone_names = read_bone_names(expykit, filepath, args.armature)
+    report['bones'] = len(bone_names)
+
+    # fraction of the bones of each preset found in the character
+    scores = {preset: found for _, found, preset in preset_handler.score_presets(bone_names)}
+    if args.preset:
+        presets = args.preset
+    else:
+        presets = [preset for preset, score in scores.items() if score >= args.min_score]
+
+    # presets are checked with indexed lookups, regardless of namespace prefixes
+    name_index = bone_mapping.NameIndex(bone_names)
+    for preset in presets:
+        try:
+            preset_skel = preset_handler.get_preset_skel(preset, bones=name_index)
+            if not preset_skel:
+                raise ValueError("preset not found")
+        except Exception as e:
+            report['presets'][preset] = {'score': scores.get(preset, 0.0), 'missing': {}, 'extra': [], 'error': str(e)}
+            continue
+
+        slots = list(iterate_slots(preset_skel))
+        found = {name_index.resolve(bone_name) for _, bone_name in slots}
+        report['presets'][preset] = {
+            'score': scores.get(preset, 0.0),
+            'missing': {path: bone_name for path, bone_name in slots if not name_index.resolve(bone_name)},
+            'extra': [bone_name for bone_name in bone_names if bone_name not in found],
+        }
+
+    return report
+
+
+def run_worker(args):
+    expykit = import_expykit()
+    if not args.root:
+        args.root = get_input_root(args.paths)
+
+    if args.command == 'lint':
+        for filepath in args.paths:
+            try:
+                report = lint_character(expykit, filepath, args)
+            except Exception:
+                report = {'file': filepath, 'error': traceback.format_exc()}
+
+            with open(report_path(args.output, filepath, args.root), 'w') as report_file:
+                json.dump(report, report_file, indent=2)
+
+        return 0
+
+    preset_skels = {}
+    if args.preset != AUTO_PRESET:
+        preset_skels[args.preset] = expykit.preset_handler.get_preset_skel(args.preset)
+        if not preset_skels[args.preset]:
+            sys.exit(f"Preset {args.preset} not found in {expykit.preset_handler.get_retarget_dir()}")
+
+    for filepath in args.paths:
+        try:
+            report = extract_character(expykit, filepath, preset_skels, args)
+        except Exception:
+            report = {'file': filepath, 'preset': args.preset, 'error': traceback.format_exc()}
+
+        with open(report_path(args.output, filepath, args.root), 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+
+    return 0
+
+
+def main():
+    args = parse_args(script_args())
+    if args.worker:
+        return run_worker(args)
+    return run_driver(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,16 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
 import bpy
 from mathutils import Vector
 from mathutils import Matrix
 from mathutils import Quaternion
+from mathutils import kdtree
 from math import pi
 
+# numpy and bmesh are imported by the functions using them: the addon doesn't load them at startup
+
 
 def is_pose_bone_all_locked(pose_bone) -> bool:
     """Return True if all pose_bone's transform channels are locked"""
@@ -622,22 +629,215 @@ def iterate_rigged_obs(armature_object):
                 break
 
 
+def iterate_rigged_obs_with_groups(armature_object, group_names):
+    """Yield meshes rigged to armature_object having at least one vertex group in group_names"""
+    if not group_names:
+        return
+
+    for ob in iterate_rigged_obs(armature_object):
+        if any(vgroup.name in group_names for vgroup in ob.vertex_groups):
+            yield ob
+
+
+def get_rigged_obs(armature_object):
+    """Return all objects deformed by armature_object, meshes or not"""
+    return [ob for ob in bpy.data.objects
+            if any(mod.type == 'ARMATURE' and mod.object == armature_object for mod in ob.modifiers)]
+
+
+def transform_rigged_data(obs, matrix):
+    """Transform the data of rigged objects, including the shape keys of meshes.
+
+    Data shared by several objects is transformed only once
+    """
+    for data in {ob.data for ob in obs if ob.data}:
+        if isinstance(data, bpy.types.Mesh):
+            data.transform(matrix, shape_keys=True)
+        else:
+            data.transform(matrix)
+
+
+def get_groups_weights(obj, vertex_groups):
+    """Return {vertex group: (indices, weights)} of the vertices assigned to vertex_groups, as NumPy arrays.
+
+    The Python API has no bulk access to vertex weights: the deform layer of the mesh is flattened once
+    into arrays of (vertex, group, weight), then the vertices of each group are selected with NumPy
+    """
+    import numpy as np
+    import bmesh
+
+    group_indices = {name: obj.vertex_groups[name].index for name in vertex_groups if name in obj.vertex_groups}
+    if not group_indices:
+        return {}
+
+    bm = bmesh.new()
+    try:
+        bm.from_mesh(obj.data, face_normals=False)
+        deform_layer = bm.verts.layers.deform.active
+        if deform_layer:
+            deform_verts = [vert[deform_layer] for vert in bm.verts]
+        else:
+            deform_verts = []
+
+        group_counts = np.fromiter(map(len, deform_verts), dtype=np.int32, count=len(deform_verts))
+        num_weights = int(group_counts.sum())
+        groups = np.fromiter(chain.from_iterable(dvert.keys() for dvert in deform_verts),
+                             dtype=np.int32, count=num_weights)
+        weights = np.fromiter(chain.from_iterable(dvert.values() for dvert in deform_verts),
+                              dtype=np.float32, count=num_weights)
+    finally:
+        bm.free()
+
+    verts = np.repeat(np.arange(len(group_counts), dtype=np.int32), group_counts)
+
+    groups_weights = {}
+    for name, group_idx in group_indices.items():
+        in_group = (groups == group_idx) & (weights != 0.0)
+        groups_weights[name] = verts[in_group], weights[in_group]
+
+    return groups_weights
+
+
+def get_group_weights(obj, vertex_group):
+    """Return indices and weights of the vertices assigned to vertex_group, as NumPy arrays"""
+    import numpy as np
+
+    try:
+        return get_groups_weights(obj, (vertex_group,))[vertex_group]
+    except KeyError:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+
 def get_group_verts(obj, vertex_group, threshold=0.1):
-    group_idx = obj.vertex_groups[vertex_group].index
-    weighted_verts = []
+    """Return indices of the vertices weighted at least threshold in vertex_group, as a NumPy array"""
+    indices, weights = get_group_weights(obj, vertex_group)
+    return indices[weights >= threshold]
 
-    for i, v in enumerate(obj.data.vertices):
-        try:
-            g = next(g for g in v.groups if g.group == group_idx)
-        except StopIteration:
-            continue
 
-        if g.weight < threshold:
+def get_verts_co(mesh, indices=None):
+    """Return vertex coordinates of mesh as a (N, 3) NumPy array, optionally restricted to indices"""
+    import numpy as np
+
+    coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', coords)
+    coords = coords.reshape(-1, 3)
+
+    if indices is None:
+        return coords
+    return coords[indices]
+
+
+def horizontal_frame(origin, x_axis=None, y_axis=None):
+    """Return a 4x4 NumPy matrix from armature space to a Z up frame centered in origin.
+
+    The frame is only rotated around Z: x_axis (or y_axis) is projected on the ground,
+    so that the frame follows the yaw of a bone but not its pitch. When no horizontal
+    direction can be found, the armature axes are used
+    """
+    import numpy as np
+
+    origin = np.asarray(origin, dtype=np.float64)
+    up = np.array((0.0, 0.0, 1.0))
+    rot = np.identity(3)
+
+    axis = np.array(x_axis if x_axis is not None else y_axis, dtype=np.float64)
+    axis[2] = 0.0
+    length = np.linalg.norm(axis)
+    if length > 1e-6:
+        axis /= length
+        if x_axis is not None:
+            rot = np.array((axis, np.cross(up, axis), up))
+        else:
+            rot = np.array((np.cross(axis, up), axis, up))
+
+    matrix = np.identity(4)
+    matrix[:3, :3] = rot
+    matrix[:3, 3] = -rot @ origin
+    return matrix
+
+
+def frame_to_armature(frame, point):
+    """Return the armature space Vector of a point expressed in frame"""
+    import numpy as np
+
+    inv_frame = np.linalg.inv(frame)
+    return Vector(inv_frame[:3, :3] @ np.asarray(point, dtype=np.float64) + inv_frame[:3, 3])
+
+
+def _side_bounds(coords, indices, matrix):
+    """Project coords[indices] by matrix and return their bounds, as (mins, maxs), for all vertices
+    and for those on the left (x >= 0) and right (x < 0) side of the frame"""
+    import numpy as np
+
+    points = coords[indices] @ matrix[:3, :3].T.astype(np.float32) + matrix[:3, 3].astype(np.float32)
+
+    bounds = {}
+    left = points[:, 0] >= 0.0
+    for side, side_points in ('ALL', points), ('L', points[left]), ('R', points[~left]):
+        if len(side_points):
+            bounds[side] = side_points.min(axis=0), side_points.max(axis=0)
+    return bounds
+
+
+def _merge_bounds(bounds_list):
+    import numpy as np
+
+    merged = {}
+    for bounds in bounds_list:
+        for side, (mins, maxs) in bounds.items():
+            try:
+                merged_mins, merged_maxs = merged[side]
+            except KeyError:
+                merged[side] = mins, maxs
+            else:
+                merged[side] = np.minimum(mins, merged_mins), np.maximum(maxs, merged_maxs)
+    return merged
+
+
+def get_landmark_bounds(armature_object, groups):
+    """Return the bounding boxes of the vertices weighted to vertex groups, across all rigged meshes.
+
+    groups is a sequence of (vertex_group, frame, threshold), where frame is a 4x4 NumPy
+    matrix from armature space, such as one from horizontal_frame(). For each group,
+    a dict of (mins, maxs) along the frame axes, with keys 'ALL', 'L' and 'R', is returned.
+
+    Weights and coordinates are read once per mesh on the main thread, then the vertices of each
+    group are selected and projected on a thread pool: NumPy releases the GIL, so characters made
+    of several meshes are processed in parallel
+    """
+    import numpy as np
+
+    arm_inv = np.array(armature_object.matrix_world.inverted(), dtype=np.float64)
+
+    jobs = []
+    for ob in iterate_rigged_obs(armature_object):
+        # weights of all the groups and coordinates are read once per mesh
+        group_weights = get_groups_weights(ob, {vertex_group for vertex_group, _, _ in groups})
+        if not group_weights:
             continue
 
-        weighted_verts.append(i)
+        coords = get_verts_co(ob.data)
+        to_armature = arm_inv @ np.array(ob.matrix_world, dtype=np.float64)
+        for group_idx, (vertex_group, frame, threshold) in enumerate(groups):
+            try:
+                indices, weights = group_weights[vertex_group]
+            except KeyError:
+                continue
+            indices = indices[weights >= threshold]
+            if not len(indices):
+                continue
+
+            jobs.append((group_idx, coords, indices, frame @ to_armature))
 
-    return weighted_verts
+    group_bounds = [[] for _ in groups]
+    if jobs:
+        with ThreadPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as executor:
+            futures = [(group_idx, executor.submit(_side_bounds, coords, indices, matrix))
+                       for group_idx, coords, indices, matrix in jobs]
+            for group_idx, future in futures:
+                group_bounds[group_idx].append(future.result())
+
+    return [_merge_bounds(bounds) for bounds in group_bounds]
 
 
 def align_to_closer_axis(src_bone, trg_bone):
@@ -690,3 +890,41 @@ def relative_pose_direction(start_pose_bone, end_pose_bone, mat):
 
     direction = mat @ direction
     return direction.normalized()
+
+
+class MirrorIndex:
+    """Spatial index of the bones of an armature, to find the counterpart of a bone on the other side of X"""
+
+    def __init__(self, arm_data):
+        self._bones = list(arm_data.bones)
+        self._tree = kdtree.KDTree(len(self._bones))
+        for i, bone in enumerate(self._bones):
+            self._tree.insert(bone.head_local, i)
+        self._tree.balance()
+
+    @staticmethod
+    def _mirror_error(src_bone, trg_bone):
+        """Return how far trg_bone is from mirroring src_bone, as the largest offset of head or tail"""
+        error = 0.0
+        for src_co, trg_co in (src_bone.head_local, trg_bone.head_local), (src_bone.tail_local, trg_bone.tail_local):
+            error = max(error, abs(trg_co.x + src_co.x), abs(trg_co.y - src_co.y), abs(trg_co.z - src_co.z))
+        return error
+
+    def find(self, bone, tolerance=0.001):
+        """Return the bone that best mirrors bone within tolerance, None if there is none"""
+        mirror_head = Vector((-bone.head_local.x, bone.head_local.y, bone.head_local.z))
+
+        best_bone = None
+        best_error = tolerance
+        # a sphere large enough to contain the tolerance box
+        for _co, i, _dist in self._tree.find_range(mirror_head, tolerance * 3 ** 0.5):
+            candidate = self._bones[i]
+            if candidate.name == bone.name:
+                continue
+
+            error = self._mirror_error(bone, candidate)
+            if error < best_error:
+                best_bone = candidate
+                best_error = error
+
+        return best_bone
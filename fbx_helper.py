@@ -1,30 +1,279 @@
-from io_scene_fbx import parse_fbx
-from io_scene_fbx.fbx_utils import FBX_KTIME
-from io_scene_fbx.import_fbx import elem_find_first
+import json
+import os
+import struct
 
+from io_scene_fbx.fbx_utils import FBX_FRAMERATES, FBX_KTIME
 
-def get_fbx_local_time(filepath):
-    try:
-        elem_root, version = parse_fbx.parse(filepath)
-    except Exception as e:
-        # can't read
+
+FBX_INDEX_NAME = "expykit_fbx_index.json"
+FBX_INDEX_VERSION = 1
+
+
+def get_fbx_local_time(filepath, index=None):
+    """Return the reference time (start, end) of the first take of a binary FBX file, None if not found.
+
+    Given an FbxIndex, files read before are not read again
+    """
+    takes = index.get_takes(filepath) if index else get_fbx_takes(filepath)
+    if not takes:
         return
 
-    takes = elem_find_first(elem_root, b'Takes')
-    local_time = None
-    for take in takes:
-        for elem in take:
-            try:
-                local_time = elem_find_first(elem, b'ReferenceTime')
-            except (KeyError, AttributeError):
+    for _, reference_time in takes:
+        if reference_time:
+            return reference_time
+
+
+def convert_from_fbx_duration(start, end):
+    return (end - start)/FBX_KTIME
+
+
+
+# Streaming reader of binary FBX files: only the records of interest are read, the others are skipped
+
+_FBX_MAGIC = b'Kaydara FBX Binary  \x00'
+_FBX_HEADER_SIZE = 27
+_FBX_SCALAR_PROPS = {b'Y': struct.Struct('<h'), b'C': struct.Struct('<?'), b'I': struct.Struct('<i'),
+                     b'F': struct.Struct('<f'), b'D': struct.Struct('<d'), b'L': struct.Struct('<q')}
+_FBX_ARRAY_HEADER = struct.Struct('<3I')
+_FBX_UINT32 = struct.Struct('<I')
+
+
+def _read_fbx_version(fbx_file):
+    header = fbx_file.read(_FBX_HEADER_SIZE)
+    if len(header) < _FBX_HEADER_SIZE or not header.startswith(_FBX_MAGIC):
+        return None
+    return _FBX_UINT32.unpack_from(header, 23)[0]
+
+
+def _iterate_fbx_records(fbx_file, version, end_offset=None):
+    """Yield (name, number of properties, end of properties, end of record) of the records at the current level.
+
+    The file is positioned at the properties of the yielded record: readers may consume them,
+    or seek the end of properties to read the nested records. The next record is always read from the end of record
+    """
+    record_header = struct.Struct('<3QB' if version >= 7500 else '<3IB')
+    while end_offset is None or fbx_file.tell() < end_offset:
+        data = fbx_file.read(record_header.size)
+        if len(data) < record_header.size:
+            return
+        record_end, num_props, props_len, name_len = record_header.unpack(data)
+        if record_end == 0:
+            # null record closing the level
+            return
+
+        name = fbx_file.read(name_len)
+        yield name, num_props, fbx_file.tell() + props_len, record_end
+        fbx_file.seek(record_end)
+
+
+def _read_fbx_props(fbx_file, num_props):
+    """Return the properties of a record, arrays are skipped and returned as None"""
+    props = []
+    for _ in range(num_props):
+        prop_type = fbx_file.read(1)
+        try:
+            scalar = _FBX_SCALAR_PROPS[prop_type]
+        except KeyError:
+            pass
+        else:
+            props.append(scalar.unpack(fbx_file.read(scalar.size))[0])
+            continue
+
+        if prop_type in (b'S', b'R'):
+            length = _FBX_UINT32.unpack(fbx_file.read(_FBX_UINT32.size))[0]
+            props.append(fbx_file.read(length))
+        elif prop_type in (b'f', b'd', b'l', b'i', b'b', b'c'):
+            _, _, byte_size = _FBX_ARRAY_HEADER.unpack(fbx_file.read(_FBX_ARRAY_HEADER.size))
+            fbx_file.seek(byte_size, 1)
+            props.append(None)
+        else:
+            raise ValueError(f"unknown FBX property type {prop_type!r}")
+
+    return props
+
+
+def get_fbx_bone_names(filepath):
+    """Return the names of the skeleton bones in a binary FBX file, None if it can't be read.
+
+    Only the Model records are read, geometry and animation are skipped without being loaded
+    """
+    bone_names = []
+    with open(filepath, 'rb') as fbx_file:
+        version = _read_fbx_version(fbx_file)
+        if version is None:
+            # not a binary FBX
+            return
+
+        for name, _, props_end, objects_end in _iterate_fbx_records(fbx_file, version):
+            if name != b'Objects':
                 continue
-            if local_time:
+
+            fbx_file.seek(props_end)
+            for obj_name, num_props, _, _ in _iterate_fbx_records(fbx_file, version, objects_end):
+                if obj_name != b'Model' or num_props < 3:
+                    continue
+
+                props = _read_fbx_props(fbx_file, 3)
+                if props[2] == b'LimbNode':
+                    # names are stored as 'Name\x00\x01Model'
+                    bone_names.append(props[1].split(b'\x00\x01', 1)[0].decode('utf-8', 'replace'))
+            break
+
+    return bone_names
+
+
+def _read_fbx_takes(fbx_file, version, takes_end):
+    takes = []
+    for name, num_props, props_end, take_end in _iterate_fbx_records(fbx_file, version, takes_end):
+        if name != b'Take':
+            # i.e. Current
+            continue
+
+        props = _read_fbx_props(fbx_file, num_props)
+        take_name = props[0].decode('utf-8', 'replace') if props and isinstance(props[0], bytes) else ""
+
+        reference_time = None
+        fbx_file.seek(props_end)
+        for elem_name, elem_props, _, _ in _iterate_fbx_records(fbx_file, version, take_end):
+            if elem_name == b'ReferenceTime':
+                reference_time = tuple(_read_fbx_props(fbx_file, elem_props))
                 break
 
-    if local_time:
-        return local_time.props
+        takes.append((take_name, reference_time))
 
+    return takes
 
-def convert_from_fbx_duration(start, end):
-    return (end - start)/FBX_KTIME
 
+def _read_fbx_frame_rate(fbx_file, version, settings_end):
+    time_mode = None
+    custom_rate = None
+    for name, _, props_end, properties_end in _iterate_fbx_records(fbx_file, version, settings_end):
+        if name != b'Properties70':
+            continue
+
+        fbx_file.seek(props_end)
+        for _, num_props, _, _ in _iterate_fbx_records(fbx_file, version, properties_end):
+            props = _read_fbx_props(fbx_file, num_props)
+            if len(props) < 5:
+                continue
+            if props[0] == b'TimeMode':
+                time_mode = props[4]
+            elif props[0] == b'CustomFrameRate':
+                custom_rate = props[4]
+        break
+
+    for frame_rate, mode in FBX_FRAMERATES:
+        if mode == time_mode:
+            return custom_rate if frame_rate < 0 else frame_rate
+
+
+def get_fbx_take_info(filepath):
+    """Return {'frame_rate': frames per second or None, 'takes': [(name, reference time (start, end))]}
+    of a binary FBX file, None if it can't be read.
+
+    Records other than GlobalSettings and Takes are skipped by their end offset without being read:
+    the file is closed once Takes is found
+    """
+    info = {'frame_rate': None, 'takes': []}
+    try:
+        with open(filepath, 'rb') as fbx_file:
+            version = _read_fbx_version(fbx_file)
+            if version is None:
+                # not a binary FBX
+                return
+
+            for name, _, props_end, record_end in _iterate_fbx_records(fbx_file, version):
+                if name == b'GlobalSettings':
+                    fbx_file.seek(props_end)
+                    info['frame_rate'] = _read_fbx_frame_rate(fbx_file, version, record_end)
+                elif name == b'Takes':
+                    fbx_file.seek(props_end)
+                    info['takes'] = _read_fbx_takes(fbx_file, version, record_end)
+                    break
+    except (OSError, ValueError, struct.error):
+        # can't read
+        return
+
+    return info
+
+
+def get_fbx_takes(filepath):
+    """Return the takes of a binary FBX file as [(name, reference time (start, end))], None if it can't be read"""
+    info = get_fbx_take_info(filepath)
+    if info is None:
+        return
+
+    return info['takes']
+
+
+class FbxIndex:
+    """Take data of .fbx files, saved between sessions. Files are read again only if their size or modification time changed.
+
+    Entries can be added from several threads, the index is saved from one, even while entries are being added
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # {file path: {'size', 'mtime', 'frame_rate', 'takes'}}
+        self.modified = False
+
+    def load(self):
+        try:
+            with open(self.path) as index_file:
+                data = json.load(index_file)
+        except (OSError, ValueError):
+            return
+
+        if data.get('version') == FBX_INDEX_VERSION:
+            self.entries = data['files']
+
+    def save(self):
+        if not self.modified:
+            return
+
+        # entries added by other threads after the copy are saved next time
+        self.modified = False
+        entries = self.entries.copy()
+
+        # write to a temporary file first: an interrupted save does not lose the index
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w') as index_file:
+                json.dump({'version': FBX_INDEX_VERSION, 'files': entries}, index_file, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+        except OSError:
+            self.modified = True
+            raise
+
+    def get(self, filepath):
+        """Return the index entry of filepath, read from the file if it is not indexed or changed since.
+        None if the file can't be found"""
+        filepath = os.path.normcase(os.path.abspath(filepath))
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return
+
+        entry = self.entries.get(filepath)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return entry
+
+        info = get_fbx_take_info(filepath)
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'frame_rate': None, 'takes': None}
+        if info is not None:
+            entry['frame_rate'] = info['frame_rate']
+            entry['takes'] = [(name, list(reference_time) if reference_time else None)
+                              for name, reference_time in info['takes']]
+
+        # a single assignment: safe from worker threads
+        self.entries[filepath] = entry
+        self.modified = True
+        return entry
+
+    def get_takes(self, filepath):
+        """Return the takes of filepath as get_fbx_takes would"""
+        entry = self.get(filepath)
+        if not entry or entry['takes'] is None:
+            return
+
+        return [(name, tuple(reference_time) if reference_time else None) for name, reference_time in entry['takes']]
@@ -15,11 +15,11 @@ from bpy.props import FloatVectorProperty
 from bpy_extras.io_utils import ImportHelper
 
 from itertools import chain
+from concurrent.futures import ThreadPoolExecutor, wait
 
 from .rig_mapping import bone_mapping
 from . import preset_handler
 from . import bone_utils
-from . import fbx_helper
 
 from mathutils import Vector
 from mathutils import Matrix
@@ -103,8 +103,18 @@ CONSTR_STATUS = (
 )
 
 
-CONSTR_TYPES = bpy.types.PoseBoneConstraints.bl_rna.functions['new'].parameters['type'].enum_items.keys()
-CONSTR_TYPES.append('ALL_TYPES')
+# Blender needs Python to keep a reference to the strings of dynamic enum items: keep them at module level
+_CONSTR_TYPE_ITEMS = []
+
+
+def iterate_constraint_types(self, context):
+    """CallBack for Enum Property. Constraint types are read from RNA on first use"""
+    if not _CONSTR_TYPE_ITEMS:
+        constr_types = bpy.types.PoseBoneConstraints.bl_rna.functions['new'].parameters['type'].enum_items.keys()
+        constr_types.insert(0, 'ALL_TYPES')  # first entry is the default
+        _CONSTR_TYPE_ITEMS.extend((ct, ct.replace('_', ' ').title(), ct) for ct in constr_types)
+
+    return _CONSTR_TYPE_ITEMS
 
 
 class ConstraintStatus(bpy.types.Operator):
@@ -120,9 +130,8 @@ class ConstraintStatus(bpy.types.Operator):
     selected_only: BoolProperty(name="Only Selected",
                                 default=False)
     
-    constr_type: EnumProperty(items=[(ct, ct.replace('_', ' ').title(), ct) for ct in CONSTR_TYPES],
-                              name="Constraint Type",
-                              default='ALL_TYPES')
+    constr_type: EnumProperty(items=iterate_constraint_types,
+                              name="Constraint Type")
 
     @classmethod
     def poll(cls, context):
@@ -304,18 +313,19 @@ class ConvertBoneNaming(bpy.types.Operator):
 
     @staticmethod
     def convert_settings(current_settings, target_settings, validate=True):
-        src_settings = preset_handler.PresetSkeleton()
-        src_settings.copy(current_settings)
-
-        src_skeleton = preset_handler.get_settings_skel(src_settings)
+        # snapshot before applying target_settings, which may overwrite current_settings
+        src_skeleton = preset_handler.get_snapshot_skel(current_settings)
         trg_skeleton = preset_handler.set_preset_skel(target_settings, validate)
 
         return src_skeleton, trg_skeleton
 
     @staticmethod
-    def rename_bones(context, src_skeleton, trg_skeleton, separator="", replace_existing=False, skip_ik=False):
+    def rename_bones(context, src_skeleton, trg_skeleton, separator="", replace_existing=False, skip_ik=False,
+                     bone_names_map=None, name_separator=':'):
         # FIXME: separator should not be necessary anymore, as it is handled at preset validation
-        bone_names_map = src_skeleton.conversion_map(trg_skeleton, skip_ik=skip_ik)
+        if bone_names_map is None:
+            bone_names_map = src_skeleton.conversion_map(trg_skeleton, skip_ik=skip_ik)
+        bone_names_map = dict(bone_names_map)
 
         if separator:
             for bone in context.object.data.bones:
@@ -324,20 +334,29 @@ class ConvertBoneNaming(bpy.types.Operator):
 
                 bone.name = bone.name.rsplit(separator, 1)[1]
 
+        # source names might lack the namespace of the armature bones
+        name_index = bone_mapping.NameIndex((b.name for b in context.object.data.bones), name_separator)
+
         additional_bones = {}
         for src_name, trg_name in bone_names_map.items():
             if not trg_name:
                 continue
             if not src_name:
                 continue
+
+            full_name = name_index.resolve(src_name)
             try:
-                src_bone = context.object.data.bones.get(src_name, None)
+                src_bone = context.object.data.bones.get(full_name, None)
             except SystemError:
                 continue
 
             if not src_bone:
                 continue
 
+            if full_name != src_name:
+                # animation tracks refer to the full name
+                additional_bones[full_name] = trg_name
+
             if replace_existing:
                 pre_existing_bone = context.object.data.bones.get(trg_name, None)
                 if pre_existing_bone:
@@ -353,16 +372,21 @@ class ConvertBoneNaming(bpy.types.Operator):
     def execute(self, context):
         if self.src_preset == "--Current--":
             current_settings = context.object.data.expykit_retarget
-            trg_settings = preset_handler.PresetSkeleton()
-            trg_settings.copy(current_settings)
-            src_skeleton, trg_skeleton = self.convert_settings(trg_settings, self.trg_preset, validate=False)
+            src_skeleton, trg_skeleton = self.convert_settings(current_settings, self.trg_preset, validate=False)
+            table_map = None
 
             set_preset = False
         else:
             src_skeleton, trg_skeleton = self.convert_presets(self.src_preset, self.trg_preset)
+            # precomputed for presets that don't depend on the armature
+            table_map = preset_handler.get_table_map(self.src_preset, self.trg_preset)
 
             set_preset = True
 
+        # keep track of the bones themselves, so that we can tell which ones got renamed
+        arm_bones = list(context.object.data.bones)
+        old_names = [bone.name for bone in arm_bones]
+
         if all((src_skeleton, trg_skeleton, src_skeleton != trg_skeleton)):
             if self.anim_tracks:
                 actions = [action for action in bpy.data.actions if validate_actions(action, context.object.path_resolve)]
@@ -371,7 +395,8 @@ class ConvertBoneNaming(bpy.types.Operator):
 
             bone_names_map = self.rename_bones(context, src_skeleton, trg_skeleton,
                                                self.prefix_separator if self.strip_prefix else "",
-                                               self.replace_existing)
+                                               self.replace_existing, bone_names_map=table_map,
+                                               name_separator=self.prefix_separator)
 
             if context.object.animation_data and context.object.data.animation_data:
                 for driver in chain(context.object.animation_data.drivers, context.object.data.animation_data.drivers):
@@ -409,14 +434,18 @@ class ConvertBoneNaming(bpy.types.Operator):
                                                         'bones["{0}"'.format(trg_name))
 
             if set_preset:
-                preset_handler.set_preset_skel(self.trg_preset)
+                name_index = bone_mapping.NameIndex((b.name for b in context.object.data.bones), self.prefix_separator)
+                preset_handler.set_preset_skel(self.trg_preset, name_index=name_index)
             else:
                 preset_handler.validate_preset(bpy.context.active_object.data, separator=self.prefix_separator)
 
         if bpy.app.version[0] > 2:
-            # blender 3.0 objects do not immediately update renamed vertex groups
-            for ob in bone_utils.iterate_rigged_obs(context.object):
-                ob.data.update()
+            # blender 3.0 objects do not immediately update renamed vertex groups.
+            # Vertex group names are stored in the mesh since then, so the mesh copy must be refreshed:
+            # tag only the meshes affected by the renaming, without recomputing their normals and edges
+            renamed = {bone.name for bone, old_name in zip(arm_bones, old_names) if bone.name != old_name}
+            for ob in bone_utils.iterate_rigged_obs_with_groups(context.object, renamed):
+                ob.data.update_tag()
 
         return {'FINISHED'}
 
@@ -520,17 +549,10 @@ class CreateTransformOffset(bpy.types.Operator):
                         constr.max_y /= self.container_scale
                         constr.max_z /= self.container_scale
 
-        # scale rigged meshes as well
-        rigged = (ob for ob in bpy.data.objects if
-                  next((mod for mod in ob.modifiers if mod.type == 'ARMATURE' and mod.object == context.object),
-                           None))
-
-        for ob in rigged:
-            if ob.data.shape_keys:
-                # cannot transform objects with shape keys
-                ob.scale /= self.container_scale
-            else:
-                ob.data.transform(inverted)
+        # scale rigged meshes as well, shape keys included
+        rigged_obs = bone_utils.get_rigged_obs(arm_ob)
+        bone_utils.transform_rigged_data(rigged_obs, inverted)
+        for ob in rigged_obs:
             # fix scale dependent attrs in modifiers
             for mod in ob.modifiers:
                 if mod.type == 'DISPLACE':
@@ -551,8 +573,7 @@ class CreateTransformOffset(bpy.types.Operator):
                     if not data_path.endswith('location'):
                         continue
 
-                    for kf in fc.keyframe_points:
-                        kf.co[1] /= self.container_scale
+                    scale_fcurve_values(fc, 1 / self.container_scale)
 
         return {'FINISHED'}
 
@@ -658,9 +679,7 @@ class ExtractMetarig(bpy.types.Operator):
                 src_skeleton = preset_handler.set_preset_skel(deform_preset)
                 current_settings = src_skeleton
             else:
-                src_settings = preset_handler.PresetSkeleton()
-                src_settings.copy(current_settings)
-                src_skeleton = preset_handler.get_settings_skel(src_settings)
+                src_skeleton = preset_handler.get_snapshot_skel(current_settings)
         else:
             src_skeleton = preset_handler.set_preset_skel(self.rig_preset)
             current_settings = context.object.data.expykit_retarget
@@ -670,11 +689,7 @@ class ExtractMetarig(bpy.types.Operator):
 
         # TODO: remove action, bring to rest pose
         if self.apply_transforms:
-            rigged = (ob for ob in bpy.data.objects if
-                      next((mod for mod in ob.modifiers if mod.type == 'ARMATURE' and mod.object == src_object),
-                           None))
-            for ob in rigged:
-                ob.data.transform(src_object.matrix_local)
+            bone_utils.transform_rigged_data(bone_utils.get_rigged_obs(src_object), src_object.matrix_local)
 
             src_armature.transform(src_object.matrix_local)
             src_object.matrix_local = Matrix()
@@ -896,59 +911,104 @@ class ExtractMetarig(bpy.types.Operator):
         except KeyError:
             pass
 
-        # find foot vertices
-        foot_verts = {}
-        foot_ob = None
-        # pick object with most foot verts
-        for ob in bone_utils.iterate_rigged_obs(src_object):
-            if src_skeleton.left_leg.foot not in ob.vertex_groups:
+        # find landmarks from the bounding boxes of the vertices weighted to feet, hips and chest of all
+        # rigged meshes, aligned to frames that follow the yaw of the source bones
+        landmark_groups = []
+        for side, leg in ('L', src_skeleton.left_leg), ('R', src_skeleton.right_leg):
+            src_foot = src_armature.bones.get(leg.foot or "")
+            if not src_foot:
                 continue
-            grouped_verts = bone_utils.get_group_verts(ob, src_skeleton.left_leg.foot, threshold=0.8)
-            if len(grouped_verts) > len(foot_verts):
-                foot_verts = grouped_verts
-                foot_ob = ob
-
-        if foot_verts:
-            # find rear verts (heel)
-            rearest_y = max([foot_ob.data.vertices[v].co[1] for v in foot_verts])
-            leftmost_x = max([foot_ob.data.vertices[v].co[0] for v in foot_verts])  # FIXME: we should counter rotate verts for more accuracy
-            rightmost_x = min([foot_ob.data.vertices[v].co[0] for v in foot_verts])
-
-            for side in 'L', 'R':
-                # invert left/right vertices when we switch sides
-                leftmost_x, rightmost_x = rightmost_x, leftmost_x
-
+            # heels face backwards: from toe to heel
+            frame = bone_utils.horizontal_frame(src_foot.head_local, y_axis=src_foot.head_local - src_foot.tail_local)
+            landmark_groups.append(('heel', side, leg.foot, frame, 0.8))
+
+        for landmark, src_name, src_left, src_right in (
+                ('pelvis', src_skeleton.spine.hips, src_skeleton.left_leg.upleg, src_skeleton.right_leg.upleg),
+                ('breast', src_skeleton.spine.spine2, src_skeleton.left_arm.shoulder, src_skeleton.right_arm.shoulder)):
+            src_bone = src_armature.bones.get(src_name or "")
+            if not src_bone:
+                continue
+            left_bone = src_armature.bones.get(src_left or "")
+            right_bone = src_armature.bones.get(src_right or "")
+            lateral = left_bone.head_local - right_bone.head_local if left_bone and right_bone else (1.0, 0.0, 0.0)
+            frame = bone_utils.horizontal_frame(src_bone.head_local, x_axis=lateral)
+            landmark_groups.append((landmark, None, src_name, frame, 0.5))
+
+        landmark_bounds = bone_utils.get_landmark_bounds(src_object, [group[2:] for group in landmark_groups])
+        landmarks = {}
+        for (landmark, side, _, frame, _), bounds in zip(landmark_groups, landmark_bounds):
+            if bounds:
+                landmarks[landmark, side] = frame, bounds
+
+        heels = {}
+        for side in 'L', 'R':
+            try:
+                frame, bounds = landmarks['heel', side]
+            except KeyError:
+                continue
+            mins, maxs = bounds['ALL']
+            # rear verts give the heel, lateral extremes give its width
+            heel_points = [bone_utils.frame_to_armature(frame, (x, maxs[1], 0.0)) for x in (mins[0], maxs[0])]
+            heel_points.sort(key=lambda co: abs(co.x))
+            heels[side] = heel_points  # inner, outer
+
+        if len(heels) == 1:
+            # mirror the foot that was found
+            (side, (inner, outer)), = heels.items()
+            heels['R' if side == 'L' else 'L'] = [Vector((-co.x, co.y, co.z)) for co in (inner, outer)]
+
+        for side, (inner, outer) in heels.items():
+            try:
                 heel_bone = met_armature.edit_bones['heel.02.' + side]
+            except KeyError:
+                continue
 
-                heel_bone.head.y = rearest_y
-                heel_bone.tail.y = rearest_y
+            heel_bone.head.x, heel_bone.head.y = inner.x, inner.y
+            heel_bone.tail.x, heel_bone.tail.y = outer.x, outer.y
 
-                if heel_bone.head.x > 0:
-                    heel_head = leftmost_x
-                    heel_tail = rightmost_x
-                else:
-                    heel_head = rightmost_x * -1
-                    heel_tail = leftmost_x * -1
-                heel_bone.head.x = heel_head
-                heel_bone.tail.x = heel_tail
+        for side in 'L', 'R':
+            # lateral extremes of the frame are on the left for positive x
+            lateral_idx = 1 if side == 'L' else 0
 
+            try:
+                spine_bone = met_armature.edit_bones['spine']
+                pelvis_bone = met_armature.edit_bones['pelvis.' + side]
+            except KeyError:
+                pass
+            else:
+                pelvis_bone.head = spine_bone.head
                 try:
-                    spine_bone = met_armature.edit_bones['spine']
-                    pelvis_bone = met_armature.edit_bones['pelvis.' + side]
+                    frame, bounds = landmarks['pelvis', None]
+                    side_bounds = bounds[side]
                 except KeyError:
                     pass
                 else:
-                    pelvis_bone.head = spine_bone.head
-                    pelvis_bone.tail.z = spine_bone.tail.z
+                    # from the hips center to the front of the hip bone
+                    tail = bone_utils.frame_to_armature(frame, (side_bounds[lateral_idx][0] / 2, side_bounds[0][1], 0.0))
+                    pelvis_bone.tail.x, pelvis_bone.tail.y = tail.x, tail.y
+                pelvis_bone.tail.z = spine_bone.tail.z
 
+            try:
+                spine_bone = met_armature.edit_bones['spine.003']
+                breast_bone = met_armature.edit_bones['breast.' + side]
+            except KeyError:
+                pass
+            else:
                 try:
-                    spine_bone = met_armature.edit_bones['spine.003']
-                    breast_bone = met_armature.edit_bones['breast.' + side]
+                    frame, bounds = landmarks['breast', None]
+                    side_bounds = bounds[side]
                 except KeyError:
                     pass
                 else:
-                    breast_bone.head.z = spine_bone.head.z
-                    breast_bone.tail.z = spine_bone.head.z
+                    # from the middle of the chest to its front
+                    lateral = side_bounds[lateral_idx][0] / 2
+                    front, back = side_bounds[0][1], side_bounds[1][1]
+                    head = bone_utils.frame_to_armature(frame, (lateral, (front + back) / 2, 0.0))
+                    tail = bone_utils.frame_to_armature(frame, (lateral, front, 0.0))
+                    breast_bone.head.x, breast_bone.head.y = head.x, head.y
+                    breast_bone.tail.x, breast_bone.tail.y = tail.x, tail.y
+                breast_bone.head.z = spine_bone.head.z
+                breast_bone.tail.z = spine_bone.head.z
 
         if self.no_face:
             for bone_name in rigify_face_bones:
@@ -1190,6 +1250,24 @@ def mute_fcurves(obj: bpy.types.Object, channel_name: str):
         if fc.data_path == channel_name:
             fc.mute = True
 
+def scale_fcurve_values(fcurve, factor):
+    """Multiply the values of all keyframes and their bezier handles by factor"""
+    import numpy as np
+
+    keyframes = fcurve.keyframe_points
+    buffer_size = len(keyframes) * 2
+    if not buffer_size:
+        return
+
+    coords = np.empty(buffer_size, dtype=np.float32)
+    for attr in ('co', 'handle_left', 'handle_right'):
+        keyframes.foreach_get(attr, coords)
+        coords[1::2] *= factor  # frames are at even indices, values at odd ones
+        keyframes.foreach_set(attr, coords)
+
+    fcurve.update()
+
+
 def limit_scale(obj):
     constr = obj.constraints.new('LIMIT_SCALE')
     
@@ -1844,11 +1922,16 @@ class ConstrainToArmature(bpy.types.Operator):
         if self.src_preset == '--':
             return {'FINISHED'}
 
+        # indices of bone names, shared by preset validation and binding by name
+        trg_index = bone_mapping.NameIndex((b.name for b in trg_ob.data.bones), self.prefix_separator)
+
         if self.trg_preset == '--Current--' and trg_ob.data.expykit_retarget.has_settings():
             trg_settings = trg_ob.data.expykit_retarget
             trg_skeleton = preset_handler.get_settings_skel(trg_settings)
+            trg_from_preset = False
         else:
-            trg_skeleton = preset_handler.set_preset_skel(self.trg_preset)
+            trg_skeleton = preset_handler.set_preset_skel(self.trg_preset, name_index=trg_index)
+            trg_from_preset = True
 
             if not trg_skeleton:
                 return {'FINISHED'}
@@ -1875,8 +1958,10 @@ class ConstrainToArmature(bpy.types.Operator):
                 if not src_settings.has_settings():
                     return {'FINISHED'}
                 src_skeleton = preset_handler.get_settings_skel(src_settings)
+                src_index = None
             else:
-                src_skeleton = preset_handler.get_preset_skel(self.src_preset, src_settings)
+                src_index = bone_mapping.NameIndex((b.name for b in ob.data.bones), self.prefix_separator)
+                src_skeleton = preset_handler.get_preset_skel(self.src_preset, src_settings, name_index=src_index)
                 if not src_skeleton:
                     return {'FINISHED'}
 
@@ -1897,15 +1982,27 @@ class ConstrainToArmature(bpy.types.Operator):
                         if not data_path.endswith('location'):
                             continue
 
-                        for kf in fc.keyframe_points:
-                            kf.co[1] /= height_ratio
-
-            bone_names_map = src_skeleton.conversion_map(trg_skeleton)
-            def_skeleton = preset_handler.get_preset_skel(src_settings.deform_preset)
-            if def_skeleton:
-                deformation_map = src_skeleton.conversion_map(def_skeleton)
-            else:
-                deformation_map = None
+                        scale_fcurve_values(fc, 1 / height_ratio)
+
+            # presets that don't depend on the armature are found in the conversion table
+            bone_names_map = None
+            deformation_map = None
+            if src_index is not None:
+                if trg_from_preset:
+                    bone_names_map = preset_handler.get_table_map(self.src_preset, self.trg_preset, src_index, trg_index,
+                                                                  src_bones=ob.data.bones, trg_bones=trg_ob.data.bones)
+                # the deform preset describes the bones of the source armature as well
+                deformation_map = preset_handler.get_table_map(self.src_preset, src_settings.deform_preset, src_index,
+                                                               src_bones=ob.data.bones, trg_bones=ob.data.bones)
+
+            if bone_names_map is None:
+                bone_names_map = src_skeleton.conversion_map(trg_skeleton)
+            # copy the cached map, bones are added and removed below
+            bone_names_map = dict(bone_names_map)
+            if deformation_map is None:
+                def_skeleton = preset_handler.get_preset_skel(src_settings.deform_preset, bones=ob.data.bones)
+                if def_skeleton:
+                    deformation_map = src_skeleton.conversion_map(def_skeleton)
 
             if self.bind_by_name:
                 # Look for bones present in both
@@ -1916,8 +2013,10 @@ class ConstrainToArmature(bpy.types.Operator):
                         continue
                     if bone_utils.is_pose_bone_all_locked(bone):
                         continue
-                    if bone_look_up in trg_ob.pose.bones:
-                        bone_names_map[bone_name] = bone_look_up
+                    # match target bones in a different namespace as well
+                    trg_name = trg_index.resolve(bone_look_up)
+                    if trg_name:
+                        bone_names_map[bone_name] = trg_name
 
             look_ats = {}
 
@@ -3055,6 +3154,9 @@ class ActionNameCandidates(bpy.types.PropertyGroup):
     name: bpy.props.StringProperty(name="Name Candidate", default="")
 
 
+FBX_SCAN_WORKERS = min(8, os.cpu_count() or 1)  # .fbx files read at the same time
+
+
 class RenameActionsFromFbxFiles(bpy.types.Operator, ImportHelper):
     bl_idname = "armature.expykit_rename_actions_fbx"
     bl_label = "Rename Actions from fbx data..."
@@ -3075,25 +3177,108 @@ class RenameActionsFromFbxFiles(bpy.types.Operator, ImportHelper):
     starts_with: StringProperty(name="Starting with", default="Action")
 
     def execute(self, context):
-        fbx_durations = dict()
-        for f in self.files:
-            fbx_path = os.path.join(self.directory, f.name)
-            local_time = fbx_helper.get_fbx_local_time(fbx_path)
-            if not local_time:
-                continue
+        # importing the fbx parser is slow, do it only when needed
+        from . import fbx_helper
+
+        self._fbx_durations = dict()
+        self._fbx_names = {os.path.join(self.directory, f.name): f.name for f in self.files}
 
-            duration = fbx_helper.convert_from_fbx_duration(*local_time)
-            duration = round(duration, 5)
-            duration = str(duration)
-            action_name = os.path.splitext(f.name[:-3])[0]
+        # files read in previous sessions are not read again
+        index_path = os.path.join(os.path.dirname(preset_handler.get_retarget_dir()), fbx_helper.FBX_INDEX_NAME)
+        self._fbx_index = fbx_helper.FbxIndex(index_path)
+        self._fbx_index.load()
 
+        if bpy.app.background:
+            for fbx_path, fbx_name in self._fbx_names.items():
+                self.add_fbx_duration(fbx_name, fbx_helper.get_fbx_local_time(fbx_path, self._fbx_index))
+
+            self.save_fbx_index()
+            self.rename_actions(context)
+            return {'FINISHED'}
+
+        # files are read in threads, results are collected by the modal timer
+        self._executor = ThreadPoolExecutor(max_workers=FBX_SCAN_WORKERS)
+        self._pending = {self._executor.submit(fbx_helper.get_fbx_local_time, fbx_path, self._fbx_index): fbx_path
+                         for fbx_path in self._fbx_names}
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.1, window=context.window)
+        wm.progress_begin(0, len(self._fbx_names))
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.finish(context)
+            self.report({'WARNING'}, "Reading of .fbx files cancelled")
+            return {'CANCELLED'}
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        done, _ = wait(self._pending, timeout=0)
+        for future in done:
+            fbx_path = self._pending.pop(future)
             try:
-                fbx_durations[duration].append(action_name)
-            except KeyError:  # entry doesn'exist yet
-                fbx_durations[duration] = action_name
-            except AttributeError:  # existing entry is not a list
-                current = fbx_durations[duration]
-                fbx_durations[duration] = [current, action_name]
+                local_time = future.result()
+            except Exception as e:
+                print(f"Expy Kit: could not read {fbx_path}: {e}")
+                continue
+
+            self.add_fbx_duration(self._fbx_names[fbx_path], local_time)
+
+        read_count = len(self._fbx_names) - len(self._pending)
+        context.window_manager.progress_update(read_count)
+        context.workspace.status_text_set(f"Reading .fbx files: {read_count}/{len(self._fbx_names)}")
+
+        if self._pending:
+            return {'RUNNING_MODAL'}
+
+        self.finish(context)
+        self.rename_actions(context)
+        return {'FINISHED'}
+
+    def finish(self, context):
+        for future in self._pending:
+            future.cancel()
+        # don't wait for the files being read: their threads end on their own. What was read so far is kept
+        self._executor.shutdown(wait=False)
+        self.save_fbx_index()
+
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+
+    def save_fbx_index(self):
+        try:
+            self._fbx_index.save()
+        except OSError as e:
+            print(f"Expy Kit: could not save .fbx index: {e}")
+
+    def add_fbx_duration(self, fbx_name, local_time):
+        if not local_time:
+            return
+
+        from . import fbx_helper
+
+        fbx_durations = self._fbx_durations
+
+        duration = fbx_helper.convert_from_fbx_duration(*local_time)
+        duration = round(duration, 5)
+        duration = str(duration)
+        action_name = os.path.splitext(fbx_name[:-3])[0]
+
+        try:
+            fbx_durations[duration].append(action_name)
+        except KeyError:  # entry doesn'exist yet
+            fbx_durations[duration] = action_name
+        except AttributeError:  # existing entry is not a list
+            current = fbx_durations[duration]
+            fbx_durations[duration] = [current, action_name]
+
+    def rename_actions(self, context):
+        fbx_durations = self._fbx_durations
 
         path_resolve = context.object.path_resolve
         for action in bpy.data.actions:
@@ -3131,8 +3316,6 @@ class RenameActionsFromFbxFiles(bpy.types.Operator, ImportHelper):
 
             action.name = fbx_match
 
-        return {'FINISHED'}
-
 
 def register_classes():
     bpy.utils.register_class(ActionRangeToScene)
@@ -49,6 +49,7 @@ class ExpyPrefs(bpy.types.AddonPreferences):
         script_path = os.path.join(script_path, 'rig_mapping', 'unreal_mapping.py')
         op = sp_col.operator(ExpyToClipboard.bl_idname, text='Path of "Unreal Mapping" to Clipboard')
         op.clip_text = script_path
+        sp_col.operator("object.expy_kit_export_bone_mapping", text='Export bone mapping for "Unreal Mapping"')
 
         col.separator()
         row = col.row()
@@ -58,6 +59,12 @@ class ExpyPrefs(bpy.types.AddonPreferences):
         op = sp_col.operator(ExpyToClipboard.bl_idname, text='Path of stored rig presets')
         op.clip_text = preset_handler.get_retarget_dir()
 
+        row = col.row()
+        split = row.split(factor=0.15, align=False)
+        sp_col = split.column()
+        sp_col = split.column()
+        sp_col.operator("object.expy_kit_presets_to_json", text='Convert stored rig presets to .json')
+
 
 def register_classes():
     bpy.utils.register_class(ExpyPrefs)
@@ -1,14 +1,21 @@
 import ast
-import importlib.util
+import filecmp
+import json
 import os
 import shutil
+from itertools import count, product
 
 import bpy
-from bpy.props import StringProperty
 from .rig_mapping.bone_mapping import HumanFingers, HumanSpine, HumanLeg, HumanArm, HumanSkeleton, SimpleFace
+from .rig_mapping.bone_mapping import NameIndex
+from .rig_mapping.mapping_graph import ConversionTable
 
 
 PRESETS_SUBDIR = os.path.join("armature", "retarget")
+CONVERSION_TABLE_NAME = "expykit_conversion_table.json"
+PRESET_EXTENSIONS = ('.py', '.json')
+PRESET_NAME_SEPARATOR = ':'  # separates file and preset name of presets in multi-preset files
+CUSTOM_BONES_PATH = ('custom', 'bones')  # preset setting of custom bones, as (identifier, bone name) pairs
 
 
 def get_retarget_dir():
@@ -24,30 +31,76 @@ def install_presets():
 
     os.makedirs(retarget_dir, exist_ok=True)
     for f in os.listdir(bundled_dir):
-        shutil.copy2(os.path.join(bundled_dir, f), retarget_dir)
+        bundled_path = os.path.join(bundled_dir, f)
+        if not os.path.isfile(bundled_path):
+            continue
 
+        # copy2 preserves modification times: unchanged presets are skipped without reading them
+        installed_path = os.path.join(retarget_dir, f)
+        if os.path.isfile(installed_path) and filecmp.cmp(bundled_path, installed_path, shallow=True):
+            continue
 
-def iterate_presets_with_current(scene, context):
-    """CallBack for Enum Property. Must take scene, context arguments"""
+        shutil.copy2(bundled_path, retarget_dir)
 
-    yield '--', "--", "None"  # first menu entry, doesn't do anything
-    yield "--Current--", "-- Current Settings --", "Use Bones set in Expy Retarget Panel"
 
-    for f in os.listdir(get_retarget_dir()):
-        if not f.endswith('.py'):
-            continue
-        yield f, os.path.splitext(f)[0].title(), ""
+# Blender needs Python to keep a reference to the strings of dynamic enum items: keep them at module level
+_PRESET_ITEMS = []
+_PRESET_ITEMS_WITH_CURRENT = []
+_PRESET_ITEMS_MTIME = None
 
 
-def iterate_presets(scene, context):
+def _refresh_preset_items():
+    """List presets again only if the presets directory changed since last time"""
+    global _PRESET_ITEMS_MTIME
+
+    retarget_dir = get_retarget_dir()
+    try:
+        mtime = os.stat(retarget_dir).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+
+    if _PRESET_ITEMS and mtime == _PRESET_ITEMS_MTIME:
+        return
+
+    preset_items = [('--', "--", "None")]  # first menu entry, doesn't do anything
+    if mtime is not None:
+        for f in sorted(os.listdir(retarget_dir)):
+            if not f.endswith(PRESET_EXTENSIONS):
+                continue
+            if f.endswith('.py'):
+                preset_items.append((f, os.path.splitext(f)[0].title(), ""))
+                continue
+
+            try:
+                preset_names = list(load_preset_file(os.path.join(retarget_dir, f)))
+            except (OSError, ValueError) as e:
+                print(f"Expy Kit: could not read presets from {f}: {e}")
+                continue
+
+            for name in preset_names:
+                if name:
+                    preset_items.append((PRESET_NAME_SEPARATOR.join((f, name)), name, f))
+                else:
+                    preset_items.append((f, os.path.splitext(f)[0].title(), ""))
+
+    _PRESET_ITEMS[:] = preset_items
+    _PRESET_ITEMS_WITH_CURRENT[:] = preset_items[:1]
+    _PRESET_ITEMS_WITH_CURRENT.append(("--Current--", "-- Current Settings --", "Use Bones set in Expy Retarget Panel"))
+    _PRESET_ITEMS_WITH_CURRENT.extend(preset_items[1:])
+
+    _PRESET_ITEMS_MTIME = mtime
+
+
+def iterate_presets_with_current(scene, context):
     """CallBack for Enum Property. Must take scene, context arguments"""
+    _refresh_preset_items()
+    return _PRESET_ITEMS_WITH_CURRENT
 
-    yield '--', "--", "None"  # first menu entry, doesn't do anything
 
-    for f in os.listdir(get_retarget_dir()):
-        if not f.endswith('.py'):
-            continue
-        yield f, os.path.splitext(f)[0].title(), ""
+def iterate_presets(scene, context):
+    """CallBack for Enum Property. Must take scene, context arguments"""
+    _refresh_preset_items()
+    return _PRESET_ITEMS
 
 
 def get_settings_skel(settings):
@@ -55,46 +108,39 @@ def get_settings_skel(settings):
     return mapping
 
 
-def validate_preset(armature_data, separator=':'):
+def validate_preset(armature_data, separator=':', name_index=None):
+    """Resolve the bones of the armature settings to the actual bone names, namespace included.
+    Bones not found in the armature are cleared. name_index can be passed to reuse the index of an armature"""
     settings = armature_data.expykit_retarget
-    a_name = armature_data.bones[0].name
-
-    prefix = ""
-    if separator in a_name:
-        prefix = a_name.rsplit(separator, 1)[0]
-        prefix += separator
+    if name_index is None:
+        name_index = NameIndex((b.name for b in armature_data.bones), separator)
 
     for group in ('spine', 'left_arm', 'left_arm_ik', 'right_arm', 'right_arm_ik',
                     'right_leg', 'right_leg_ik', 'left_leg', 'left_leg_ik', 'face'):
 
         trg_setting = getattr(settings, group)
         for k, v in trg_setting.items():
-            try:
-                if v not in armature_data.bones:
-                    with_prefix = prefix + v
-                    setattr(trg_setting, k, with_prefix if with_prefix in armature_data.bones else "")
-            except TypeError:
+            if k == 'name':  # skip Property Group name
+                continue
+            if not v or not isinstance(v, str):
                 continue
-                
+
+            resolved = name_index.resolve(v)
+            if resolved != v:
+                setattr(trg_setting, k, resolved)
+
     # Handle legacy single custom bone
-    if settings.custom.name and settings.custom.name not in armature_data.bones:
-        with_prefix = prefix + settings.custom.name
-        settings.custom.name = with_prefix if with_prefix in armature_data.bones else ""
-        
-    # Handle dynamic custom bone properties
-    if hasattr(settings.custom, 'get_bones'):
-        for identifier, bone_name in settings.custom.get_bones():
-            if bone_name and bone_name not in armature_data.bones:
-                with_prefix = prefix + bone_name
-                if with_prefix in armature_data.bones:
-                    setattr(settings.custom, identifier, with_prefix)
-                else:
-                    setattr(settings.custom, identifier, "")
+    if settings.custom.name:
+        settings.custom.name = name_index.resolve(settings.custom.name)
+
+    for entry in settings.custom.bones:
+        resolved = name_index.resolve(entry.bone_name)
+        if resolved != entry.bone_name:
+            entry.bone_name = resolved
 
     # Handle root bone
-    if settings.root and settings.root not in armature_data.bones:
-        with_prefix = prefix + settings.root
-        settings.root = with_prefix if with_prefix in armature_data.bones else ""
+    if settings.root:
+        settings.root = name_index.resolve(settings.root)
 
     finger_bones = 'meta', 'a', 'b', 'c'
     for trg_grp in settings.left_fingers, settings.right_fingers:
@@ -104,56 +150,563 @@ def validate_preset(armature_data, separator=':'):
 
             for slot in finger_bones:
                 bone_name = trg_finger.get(slot)
-                if bone_name and bone_name not in armature_data.bones:
-                    with_prefix = prefix + bone_name
-                    trg_finger[slot] = with_prefix if with_prefix in armature_data.bones else ""
+                if bone_name:
+                    trg_finger[slot] = name_index.resolve(bone_name)
 
+    # finger slots are written as ID properties, which don't call the update callbacks
+    invalidate_settings_snapshots()
 
-def set_preset_skel(preset, validate=True):
-    if not preset:
-        return
-    if not preset.endswith(".py"):
+
+class BoneChoice:
+    """Preset value depending on the armature: if_found when bone_name is in the armature, otherwise the fallback"""
+    __slots__ = ('bone_name', 'if_found', 'otherwise')
+
+    def __init__(self, bone_name, if_found, otherwise):
+        self.bone_name = bone_name
+        self.if_found = if_found
+        self.otherwise = otherwise
+
+    def resolve(self, bones):
+        return self.if_found if self.bone_name in bones else self.otherwise
+
+
+BONE_CHAINS_CACHE_SIZE = 8  # armatures whose chains are kept by each BonePattern
+
+
+def _armature_key(bones):
+    """Return a key of the armature owning bones, None if bones are not those of an armature"""
+    try:
+        return bones.id_data.as_pointer()
+    except AttributeError:
+        return None
+
+
+class BonePattern:
+    """Preset bones named after a pattern, i.e. "DEF-f_{finger}.{i:02d}.{side}", for every value of its variables.
+
+    Variables joined by commas, i.e. "finger, side", take their values together from a list of tuples,
+    other variables are combined with each other. A range without "stop" follows a chain of bones
+    as long as they are found in the armature. Chains are cached per armature, and reused only while
+    the bones found are still there and the chains don't go further, i.e. after bones are renamed
+    """
+    __slots__ = ('slot', 'bone', 'variables', '_chain', '_expanded')
+
+    def __init__(self, slot, bone, variables=None):
+        self.slot = slot  # setting path pattern, i.e. "left_fingers.{finger}.{segment}" or "custom.bones.tail_{i}"
+        self.bone = bone
+        self.variables = variables or {}
+        self._expanded = {}
+
+        self._chain = None
+        for names, values in self.variables.items():
+            if not isinstance(values, dict):
+                continue
+            if values.get('step', 1) == 0:
+                raise ValueError(f"range of {names} in pattern {bone} has step 0")
+            if values.get('stop') is None:
+                if self._chain or ',' in names:
+                    raise ValueError(f"pattern {bone} follows more than one chain")
+                self._chain = names.strip(), values.get('start', 0), values.get('step', 1)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['slot'], data['bone'], data.get('vars'))
+
+    def to_dict(self):
+        return {'slot': self.slot, 'bone': self.bone, 'vars': self.variables}
+
+    def is_chain(self):
+        """Return True if the bones of the pattern depend on the armature"""
+        return self._chain is not None
+
+    def _iterate_values(self):
+        """Yield the variables of the pattern as a list of (names, values)"""
+        for names, values in self.variables.items():
+            names = tuple(name.strip() for name in names.split(','))
+            if isinstance(values, dict):
+                if values.get('stop') is None:
+                    continue
+                if len(names) != 1:
+                    raise ValueError(f"range of {', '.join(names)} in pattern {self.bone}")
+                values = [(i,) for i in range(values.get('start', 0), values['stop'], values.get('step', 1))]
+            elif len(names) == 1:
+                values = [(value,) for value in values]
+
+            yield names, values
+
+    def _format(self, fields):
+        return tuple(self.slot.format(**fields).split('.')), self.bone.format(**fields)
+
+    def _expand(self, bones):
+        """Return the (attribute path, bone name) pairs of the pattern and, for chains,
+        the names of the first bones not found"""
+        expanded = []
+        chain_ends = []
+
+        variables = list(self._iterate_values())
+        for combination in product(*(values for _, values in variables)):
+            fields = {}
+            for (names, _), values in zip(variables, combination):
+                fields.update(zip(names, values))
+
+            if not self._chain:
+                expanded.append(self._format(fields))
+                continue
+
+            name, start, step = self._chain
+            for i in count(start, step):
+                fields[name] = i
+                attr_path, bone_name = self._format(fields)
+                if bone_name not in bones:
+                    chain_ends.append(bone_name)
+                    break
+                expanded.append((attr_path, bone_name))
+
+        return tuple(expanded), tuple(chain_ends)
+
+    def expand(self, bones=()):
+        """Return the (attribute path, bone name) pairs of the pattern, chains are followed in bones"""
+        key = _armature_key(bones) if self._chain else ()
+        try:
+            expanded, chain_ends = self._expanded[key]
+        except KeyError:
+            pass
+        else:
+            if not self._chain or (all(bone_name in bones for _, bone_name in expanded)
+                                   and not any(bone_name in bones for bone_name in chain_ends)):
+                return expanded
+
+        expanded, chain_ends = self._expand(bones)
+        if key is not None:
+            if len(self._expanded) >= BONE_CHAINS_CACHE_SIZE:
+                # drop the oldest armature
+                del self._expanded[next(iter(self._expanded))]
+            self._expanded[key] = expanded, chain_ends
+
+        return expanded
+
+
+_ARMATURE_BONES_EXPR = ast.dump(ast.parse("bpy.context.object.data.bones", mode='eval').body)
+
+
+def _parse_attr_path(node):
+    """Return the attribute names of a 'skeleton.group.slot' expression, None for other expressions"""
+    path = []
+    while isinstance(node, ast.Attribute):
+        path.append(node.attr)
+        node = node.value
+
+    if not isinstance(node, ast.Name) or node.id != 'skeleton' or not path:
+        return None
+
+    return tuple(reversed(path))
+
+
+def _parse_value(node):
+    """Return the value of a literal, or a BoneChoice for "'A' if 'A' in bpy.context.object.data.bones else 'B'".
+    Raise ValueError for other expressions"""
+    if isinstance(node, ast.IfExp):
+        test = node.test
+        if (isinstance(test, ast.Compare) and len(test.ops) == 1 and isinstance(test.ops[0], ast.In)
+                and ast.dump(test.comparators[0]) == _ARMATURE_BONES_EXPR):
+            return BoneChoice(ast.literal_eval(test.left), ast.literal_eval(node.body), ast.literal_eval(node.orelse))
+
+    return ast.literal_eval(node)
+
+
+def _parse_custom_bones(node, assignments, custom_entries):
+    """Parse the custom bone lines written by Blender presets, return False for other lines:
+
+    skeleton.custom.bones.clear()
+    item_sub_1 = skeleton.custom.bones.add()
+    item_sub_1.name = 'tail'
+    item_sub_1.bone_name = 'Tail'
+    """
+    if isinstance(node, ast.Expr) and isinstance(node.value, ast.Call) and not node.value.args:
+        func = node.value.func
+        if isinstance(func, ast.Attribute) and func.attr == 'clear' and _parse_attr_path(func.value) == CUSTOM_BONES_PATH:
+            assignments.append((CUSTOM_BONES_PATH, []))
+            custom_entries.clear()
+            return True
+        return False
+
+    if not isinstance(node, ast.Assign) or len(node.targets) != 1:
+        return False
+
+    target = node.targets[0]
+    if isinstance(target, ast.Name) and isinstance(node.value, ast.Call) and not node.value.args:
+        func = node.value.func
+        if not (isinstance(func, ast.Attribute) and func.attr == 'add' and _parse_attr_path(func.value) == CUSTOM_BONES_PATH):
+            return False
+        if not assignments or assignments[-1][0] != CUSTOM_BONES_PATH:
+            raise ValueError("custom bones added without clearing")
+
+        entry = custom_entries[target.id] = ["", ""]
+        assignments[-1][1].append(entry)
+        return True
+
+    if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and target.value.id in custom_entries:
+        try:
+            field = ('name', 'bone_name').index(target.attr)
+        except ValueError:
+            return True  # other settings of the entry
+
+        custom_entries[target.value.id][field] = ast.literal_eval(node.value)
+        return True
+
+    return False
+
+
+def _is_preset_header(node):
+    """Match 'import bpy' and 'skeleton = bpy.context.object.data.expykit_retarget'"""
+    if isinstance(node, ast.Import):
+        return [alias.name for alias in node.names] == ['bpy']
+
+    return (isinstance(node, ast.Assign) and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name) and node.targets[0].id == 'skeleton')
+
+
+class CompiledPreset:
+    """Preset parsed once.
+
+    Presets made of plain assignments are stored as an immutable tuple of (attribute path, value)
+    and applied without executing any code, followed by their BonePattern expansions.
+    Other .py presets are compiled and run on the skeleton
+    """
+
+    def __init__(self, assignments=None, code=None, patterns=()):
+        self.assignments = assignments
+        self.code = code
+        self.patterns = patterns
+
+    @classmethod
+    def from_script(cls, path):
+        """Parse a .py preset"""
+        with open(path) as preset_file:
+            tree = ast.parse(preset_file.read(), filename=path)
+
+        # the preset header would apply the preset to the current armature: strip it
+        tree.body = [node for node in tree.body if not _is_preset_header(node)]
+
+        assignments = []
+        custom_entries = {}  # {entry variable: [identifier, bone name]} of custom bones
+        for node in tree.body:
+            try:
+                if _parse_custom_bones(node, assignments, custom_entries):
+                    continue
+
+                attr_path = None
+                if isinstance(node, ast.Assign) and len(node.targets) == 1:
+                    attr_path = _parse_attr_path(node.targets[0])
+                if not attr_path:
+                    raise ValueError
+                assignments.append((attr_path, _parse_value(node.value)))
+            except ValueError:
+                return cls(code=compile(tree, path, 'exec'))
+
+        # custom bone entries are filled after being added
+        assignments = [(attr_path, tuple(map(tuple, value)) if attr_path == CUSTOM_BONES_PATH else value)
+                       for attr_path, value in assignments]
+        return cls(assignments=_convert_legacy_custom(assignments))
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load a preset from nested dictionaries of settings, as found in .json presets, i.e.
+
+        {"spine": {"hips": "Hips"}, "left_leg": {"toe": {"if_found": "toe.L", "otherwise": "toe_fk.L"}}}
+
+        where a bone is set to "if_found" when "bone" (by default "if_found" itself) is in the armature.
+        Bones following a pattern are listed under "patterns", see BonePattern, i.e.
+
+        {"patterns": [{"slot": "custom.bones.tail_{i}", "bone": "DEF-tail.{i:03d}", "vars": {"i": {"start": 1}}}]}
+        """
+        data = dict(data)
+        patterns = tuple(BonePattern.from_dict(pattern) for pattern in data.pop('patterns', ()))
+
+        return cls(assignments=_convert_legacy_custom(_flatten_preset_dict(data)), patterns=patterns)
+
+    def to_dict(self):
+        """Return the preset as nested dictionaries of settings. Raise ValueError for presets that run code"""
+        if self.code:
+            raise ValueError("preset is not made of plain assignments")
+
+        data = {}
+        for attr_path, value in self.assignments:
+            group = data
+            for attr in attr_path[:-1]:
+                group = group.setdefault(attr, {})
+
+            if isinstance(value, BoneChoice):
+                value = {'bone': value.bone_name, 'if_found': value.if_found, 'otherwise': value.otherwise}
+            elif attr_path == CUSTOM_BONES_PATH:
+                value = dict(value)
+            group[attr_path[-1]] = value
+
+        if self.patterns:
+            data['patterns'] = [pattern.to_dict() for pattern in self.patterns]
+
+        return data
+
+    def choice_bones(self):
+        """Return the bones looked up in the armature by BoneChoice values"""
+        return frozenset(value.bone_name for _, value in self.assignments if isinstance(value, BoneChoice))
+
+    def has_chains(self):
+        """Return True if the preset follows chains of bones in the armature, see BonePattern"""
+        return any(pattern.is_chain() for pattern in self.patterns)
+
+    def apply(self, skeleton, bones=None):
+        """Set the preset bones to skeleton, either armature settings or a PresetSkeleton.
+
+        Bones found in the armature are looked up in bones, by default those of the active object
+        """
+        if self.code:
+            exec(self.code, {'bpy': bpy, 'skeleton': skeleton})
+            return
+
+        if bones is None:
+            bones = bpy.context.object.data.bones if bpy.context.object else ()
+
+        for attr_path, value in self.assignments:
+            if attr_path == CUSTOM_BONES_PATH:
+                skeleton.custom.clear_bones()
+                for identifier, bone_name in value:
+                    skeleton.custom.add_bone(identifier, bone_name)
+                continue
+
+            if isinstance(value, BoneChoice):
+                value = value.resolve(bones)
+
+            _set_setting(skeleton, attr_path, value)
+
+        for pattern in self.patterns:
+            for attr_path, bone_name in pattern.expand(bones):
+                if attr_path[:-1] == CUSTOM_BONES_PATH:
+                    skeleton.custom.add_bone(attr_path[-1], bone_name)
+                else:
+                    _set_setting(skeleton, attr_path, bone_name)
+
+
+def _set_setting(skeleton, attr_path, value):
+    target = skeleton
+    for attr in attr_path[:-1]:
+        target = getattr(target, attr)
+    setattr(target, attr_path[-1], value)
+
+
+def _is_legacy_custom(attr_path, value):
+    return len(attr_path) == 2 and attr_path[0] == 'custom' and attr_path[1] != 'name' and isinstance(value, str)
+
+
+def _convert_legacy_custom(assignments):
+    """Return assignments as a tuple, with the custom bones of older presets, set as 'skeleton.custom.<identifier>',
+    moved to the custom bone entries"""
+    assignments = list(assignments)
+    legacy_bones = tuple((attr_path[1], value) for attr_path, value in assignments if _is_legacy_custom(attr_path, value))
+    if not legacy_bones:
+        return tuple(assignments)
+
+    assignments = [(attr_path, value) for attr_path, value in assignments if not _is_legacy_custom(attr_path, value)]
+    for i, (attr_path, value) in enumerate(assignments):
+        if attr_path == CUSTOM_BONES_PATH:
+            assignments[i] = CUSTOM_BONES_PATH, value + legacy_bones
+            break
+    else:
+        assignments.append((CUSTOM_BONES_PATH, legacy_bones))
+
+    return tuple(assignments)
+
+
+def _flatten_preset_dict(data, attr_path=()):
+    for key, value in data.items():
+        if attr_path + (key,) == CUSTOM_BONES_PATH:
+            yield CUSTOM_BONES_PATH, tuple(value.items())
+        elif isinstance(value, dict):
+            if 'if_found' in value:
+                yield attr_path + (key,), BoneChoice(value.get('bone', value['if_found']),
+                                                     value['if_found'], value.get('otherwise', ""))
+            else:
+                yield from _flatten_preset_dict(value, attr_path + (key,))
+        elif isinstance(value, (str, bool)):
+            yield attr_path + (key,), value
+        else:
+            raise ValueError(f"invalid value for {'.'.join(attr_path + (key,))}: {value!r}")
+
+
+_PRESET_FILES = {}
+
+
+def load_preset_file(preset_path):
+    """Return {preset name: CompiledPreset} of a preset file, parsed again only if the file was modified.
+
+    .py files and single preset .json files hold one preset with an empty name.
+    Multi-preset .json files hold their presets under the "presets" key
+    """
+    mtime = os.stat(preset_path).st_mtime_ns
+    try:
+        cached_mtime, presets = _PRESET_FILES[preset_path]
+    except KeyError:
+        pass
+    else:
+        if cached_mtime == mtime:
+            return presets
+
+    if preset_path.endswith('.json'):
+        with open(preset_path) as preset_file:
+            data = json.load(preset_file)
+
+        if 'presets' in data:
+            presets = {name: CompiledPreset.from_dict(preset) for name, preset in data['presets'].items()}
+        else:
+            presets = {"": CompiledPreset.from_dict(data)}
+    else:
+        presets = {"": CompiledPreset.from_script(preset_path)}
+
+    _PRESET_FILES[preset_path] = mtime, presets
+    return presets
+
+
+PRESET_WATCH_INTERVAL = 2.0  # seconds between two polls of the presets directory
+
+_WATCHED_PRESETS = None  # {file name: modification time} at the last poll
+
+
+def poll_presets():
+    """Recompile the preset files modified since the last poll, forget those removed.
+
+    Unchanged files are not read again. Return the names of the files that changed
+    """
+    global _PRESET_ITEMS_MTIME, _WATCHED_PRESETS
+
+    retarget_dir = get_retarget_dir()
+    try:
+        entries = {e.name: e.stat().st_mtime_ns for e in os.scandir(retarget_dir)
+                   if e.name.endswith(PRESET_EXTENSIONS) and e.is_file()}
+    except FileNotFoundError:
+        entries = {}
+
+    if _WATCHED_PRESETS is None:
+        # first poll: presets are compiled when first used
+        _WATCHED_PRESETS = entries
+        return []
+
+    changed = [f for f, mtime in entries.items() if _WATCHED_PRESETS.get(f) != mtime]
+    removed = [f for f in _WATCHED_PRESETS if f not in entries]
+    if not changed and not removed:
+        return []
+
+    for f in removed:
+        _PRESET_FILES.pop(os.path.join(retarget_dir, f), None)
+
+    for f in changed:
+        try:
+            load_preset_file(os.path.join(retarget_dir, f))
+        except Exception as e:
+            print(f"Expy Kit: could not read preset {f}: {e}")
+
+    _WATCHED_PRESETS = entries
+
+    # presets in .json files can change without touching the directory: list them again
+    _PRESET_ITEMS_MTIME = None
+
+    return sorted(changed + removed)
+
+
+def _watch_presets():
+    reloaded = poll_presets()
+    if reloaded:
+        print(f"Expy Kit: reloaded presets {', '.join(reloaded)}")
+
+    return PRESET_WATCH_INTERVAL
+
+
+def start_preset_watch():
+    """Poll the presets directory on a timer, so that edited presets are picked up while Blender is open"""
+    if bpy.app.background:
         return
 
-    preset_path = os.path.join(get_retarget_dir(), preset)
+    poll_presets()
+    if not bpy.app.timers.is_registered(_watch_presets):
+        bpy.app.timers.register(_watch_presets, first_interval=PRESET_WATCH_INTERVAL, persistent=True)
+
+
+def stop_preset_watch():
+    global _WATCHED_PRESETS
+
+    if bpy.app.timers.is_registered(_watch_presets):
+        bpy.app.timers.unregister(_watch_presets)
+    _WATCHED_PRESETS = None
+
+
+def get_compiled_preset(preset_path, name=""):
+    """Return the CompiledPreset called name in preset_path"""
+    return load_preset_file(preset_path)[name]
+
+
+def convert_presets(preset_paths, json_path):
+    """Write .py presets to a single .json file, named after their files. Return the presets that could not be converted"""
+    presets = {}
+    skipped = []
+    for preset_path in preset_paths:
+        try:
+            preset = get_compiled_preset(preset_path).to_dict()
+        except (OSError, SyntaxError, ValueError):
+            skipped.append(preset_path)
+            continue
+
+        presets[os.path.splitext(os.path.basename(preset_path))[0]] = preset
+
+    with open(json_path, 'w') as json_file:
+        json.dump({'presets': presets}, json_file, indent=4)
+
+    return skipped
+
+
+def get_preset_path(preset):
+    """Return the path and the name of a preset in the presets directory, given as 'file' or 'file:name'"""
+    if not preset:
+        return None, ""
+
+    filename, _, name = preset.partition(PRESET_NAME_SEPARATOR)
+    if not filename.endswith(PRESET_EXTENSIONS):
+        return None, ""
+
+    preset_path = os.path.join(get_retarget_dir(), filename)
     if not os.path.isfile(preset_path):
+        return None, ""
+
+    return preset_path, name
+
+
+def set_preset_skel(preset, validate=True, name_index=None):
+    preset_path, name = get_preset_path(preset)
+    if not preset_path:
         return
 
-    spec = importlib.util.spec_from_file_location("sel_preset", preset_path)
-    preset_mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(preset_mod)
-    
+    settings = bpy.context.object.data.expykit_retarget
+    get_compiled_preset(preset_path, name).apply(settings, bones=settings.id_data.bones)
+
     if validate:
-        validate_preset(bpy.context.active_object.data)
+        validate_preset(bpy.context.active_object.data, name_index=name_index)
 
-    mapping = get_settings_skel(preset_mod.skeleton)
+    mapping = get_settings_skel(settings)
     return mapping
 
-def get_preset_skel(preset, settings=None):
-    if not preset:
-        return
-    if not preset.endswith(".py"):
-        return
 
-    preset_path = os.path.join(get_retarget_dir(), preset)
-    if not os.path.isfile(preset_path):
+def get_preset_skel(preset, settings=None, name_index=None, bones=None):
+    preset_path, name = get_preset_path(preset)
+    if not preset_path:
         return
 
     # run preset on current settings if there are any, otherwise create Preset settings
-    # the attributes of 'skeleton' are set in the preset
     skeleton = settings if settings else PresetSkeleton()
-
-    # HACKISH: executing the preset would apply it to the current armature (target).
-    # We don't want that if this is runnning on the source armature. Using ast instead
-    code = ast.parse(open(preset_path).read())
-
-    # remove skeleton 
-    code.body.pop(0)  # remove line 'import bpy' from preset
-    code.body.pop(0)  # remove line 'skeleton = bpy.context.object.data.expykit_retarget' from preset
-    eval(compile(code, '', 'exec'))
+    if settings and bones is None:
+        # bones are looked up in the armature of the settings, which may not be the active one
+        bones = settings.id_data.bones
+    get_compiled_preset(preset_path, name).apply(skeleton, bones=bones)
 
     if settings:
-        validate_preset(settings.id_data)
+        validate_preset(settings.id_data, name_index=name_index)
 
     mapping = HumanSkeleton(preset=skeleton)
     del skeleton
@@ -161,6 +714,310 @@ def get_preset_skel(preset, settings=None):
     return mapping
 
 
+_SETTINGS_SNAPSHOTS = {}
+
+
+def invalidate_settings_snapshots(*args):
+    """Drop the cached snapshots of armature settings. Can be used as property update or app handler callback"""
+    _SETTINGS_SNAPSHOTS.clear()
+
+
+def _snapshot_settings(settings):
+    skeleton = PresetSkeleton()
+    skeleton.copy(settings)
+
+    assignments = []
+    for group in ('spine', 'left_arm', 'left_arm_ik', 'right_arm', 'right_arm_ik',
+                  'right_leg', 'right_leg_ik', 'left_leg', 'left_leg_ik', 'face'):
+        for k, v in getattr(skeleton, group).items():
+            assignments.append(((group, k), v))
+
+    assignments.append((('custom', 'name'), skeleton.custom.name))
+    assignments.append((CUSTOM_BONES_PATH, tuple(skeleton.custom.get_bones())))
+
+    assignments.append((('root',), skeleton.root))
+
+    for group in ('left_fingers', 'right_fingers'):
+        for k, finger in getattr(skeleton, group).items():
+            for slot in ('a', 'b', 'c', 'meta'):
+                assignments.append(((group, k, slot), getattr(finger, slot)))
+
+    return CompiledPreset(assignments=tuple(assignments))
+
+
+def get_settings_snapshot(settings):
+    """Return an immutable copy of armature settings, as a CompiledPreset.
+
+    Snapshots of Armature settings are cached until the settings change; other skeletons are copied every time
+    """
+    if not isinstance(settings, bpy.types.PropertyGroup):
+        return _snapshot_settings(settings)
+
+    key = settings.as_pointer()
+    # the address of a removed armature can be reused by a new one: check that the armature is the same
+    armature = settings.id_data
+    armature_id = getattr(armature, 'session_uid', None), armature.name
+    try:
+        snapshot_id, snapshot = _SETTINGS_SNAPSHOTS[key]
+    except KeyError:
+        pass
+    else:
+        if snapshot_id == armature_id:
+            return snapshot
+
+    snapshot = _snapshot_settings(settings)
+    _SETTINGS_SNAPSHOTS[key] = armature_id, snapshot
+    return snapshot
+
+
+def get_snapshot_skel(settings):
+    """Return a HumanSkeleton from a snapshot of settings, unaffected by later changes of the settings"""
+    skeleton = PresetSkeleton()
+    get_settings_snapshot(settings).apply(skeleton)
+
+    return HumanSkeleton(preset=skeleton)
+
+
+def normalize_bone_name(bone_name, separator=':'):
+    """Bone name without namespace prefix, lower case"""
+    return bone_name.rsplit(separator, 1)[-1].lower()
+
+
+NAME_PREFIX_SEPARATORS = ('_', '-', '.', ' ')
+
+
+def get_name_prefix(bone_names):
+    """Return the prefix of most normalized bone names, up to their first separator, i.e. 'def-' or 'bip01 '.
+    Empty string if no prefix is shared by more than half of the names"""
+    prefix_count = {}
+    for name in bone_names:
+        ends = [name.find(separator) for separator in NAME_PREFIX_SEPARATORS if separator in name]
+        if ends:
+            prefix = name[:min(ends) + 1]
+            prefix_count[prefix] = prefix_count.get(prefix, 0) + 1
+
+    prefix = max(prefix_count, key=prefix_count.get, default="")
+    if prefix and prefix_count[prefix] * 2 > len(bone_names):
+        return prefix
+    return ""
+
+
+def get_preset_fingerprint(preset):
+    """Return the normalized bone names of a preset as a frozenset, and their prefix, see get_name_prefix"""
+    skeleton = get_preset_skel(preset)
+    if not skeleton:
+        return frozenset(), ""
+
+    bone_names = list(skeleton.bone_names())
+    bone_names.extend(v for v in skeleton.face.values() if isinstance(v, str))
+
+    bone_names = frozenset(normalize_bone_name(name) for name in bone_names if name and isinstance(name, str))
+    return bone_names, get_name_prefix(bone_names)
+
+
+_FINGERPRINTS = {}
+_FINGERPRINTS_KEY = None
+
+
+def _get_preset_mtimes():
+    """Return {file name: modification time} of the installed preset files"""
+    try:
+        return {e.name: e.stat().st_mtime_ns for e in os.scandir(get_retarget_dir()) if e.name.endswith(PRESET_EXTENSIONS)}
+    except FileNotFoundError:
+        return {}
+
+
+def get_preset_fingerprints():
+    """Return {preset: (file modification time, fingerprint)} of the installed presets.
+
+    Fingerprints are cached and only the presets added or modified since the last call are parsed again
+    """
+    global _FINGERPRINTS_KEY
+
+    retarget_dir = get_retarget_dir()
+    entries = _get_preset_mtimes()
+
+    dir_key = frozenset(entries.items())
+    if dir_key == _FINGERPRINTS_KEY:
+        return _FINGERPRINTS
+
+    previous = dict(_FINGERPRINTS)
+    _FINGERPRINTS.clear()
+    for filename, mtime in entries.items():
+        try:
+            preset_names = list(load_preset_file(os.path.join(retarget_dir, filename)))
+        except Exception as e:
+            print(f"Expy Kit: could not read preset {filename}: {e}")
+            continue
+
+        for name in preset_names:
+            preset = PRESET_NAME_SEPARATOR.join((filename, name)) if name else filename
+            try:
+                fingerprint_mtime, fingerprint = previous[preset]
+            except KeyError:
+                pass
+            else:
+                if fingerprint_mtime == mtime:
+                    _FINGERPRINTS[preset] = fingerprint_mtime, fingerprint
+                    continue
+
+            try:
+                _FINGERPRINTS[preset] = mtime, get_preset_fingerprint(preset)
+            except Exception as e:
+                print(f"Expy Kit: could not read preset {preset}: {e}")
+
+    _FINGERPRINTS_KEY = dir_key
+    return _FINGERPRINTS
+
+
+def score_presets(bone_names):
+    """Score installed presets against bone_names, regardless of namespace prefixes.
+
+    Return a list of (score, found, preset), best match first. found is the fraction of preset bones
+    found among bone_names. The score is the F-score of found and of the fraction of bone_names
+    that are preset bones, so that a preset covering only part of the armature ranks after the complete one.
+    Presets sharing the name prefix of the armature, i.e. 'DEF-', come first among equal scores
+    """
+    names = frozenset(normalize_bone_name(name) for name in bone_names)
+    prefix = get_name_prefix(names)
+
+    scores = []
+    for preset, (_, (fingerprint, fingerprint_prefix)) in get_preset_fingerprints().items():
+        if not fingerprint:
+            continue
+
+        matching = len(fingerprint & names)
+        # harmonic mean of matching / len(fingerprint) and matching / len(names)
+        score = 2 * matching / (len(fingerprint) + len(names))
+        scores.append((score, fingerprint_prefix == prefix, matching / len(fingerprint), preset))
+
+    scores.sort(reverse=True)
+    return [(score, found, preset) for score, _, found, preset in scores]
+
+
+def detect_preset(armature_data, min_score=0.5):
+    """Return the preset that best matches the bones of armature_data, None if none is good enough.
+
+    min_score is the fraction of the preset bones that must be found in the armature
+    """
+    for _, found, preset in score_presets(b.name for b in armature_data.bones):
+        if found >= min_score:
+            return preset
+
+    return None
+
+
+_CONVERSION_TABLE = None
+
+
+def get_conversion_table_path():
+    return os.path.join(os.path.dirname(get_retarget_dir()), CONVERSION_TABLE_NAME)
+
+
+def get_conversion_table():
+    """Return the ConversionTable of the installed presets.
+
+    The table is read from its cache file, and computed again only when preset files are added, removed or modified,
+    or when the addon is updated. Presets that look up bones in the armature are computed as if those bones were found, see get_table_map.
+    Presets that run code or follow chains of bones in the armature are left out
+    """
+    global _CONVERSION_TABLE
+
+    from . import bl_info
+
+    preset_mtimes = _get_preset_mtimes()
+    # updates may change the conversion maps: the version is stored as a list, as read back from the cache file
+    sources = {'addon_version': list(bl_info['version']), 'presets': preset_mtimes}
+    if _CONVERSION_TABLE and _CONVERSION_TABLE.sources == sources:
+        return _CONVERSION_TABLE
+
+    table_path = get_conversion_table_path()
+    try:
+        table = ConversionTable.load(table_path)
+    except (OSError, ValueError, KeyError):
+        table = None
+
+    if not table or table.sources != sources:
+        skeletons = {}
+        choices = {}
+        for preset in _iterate_preset_ids(preset_mtimes):
+            preset_path, name = get_preset_path(preset)
+            try:
+                compiled = get_compiled_preset(preset_path, name)
+                if compiled.code or compiled.has_chains():
+                    continue
+
+                choice_bones = compiled.choice_bones()
+                skeletons[preset] = get_preset_skel(preset, bones=choice_bones)
+                if choice_bones:
+                    choices[preset] = sorted(choice_bones)
+            except Exception as e:
+                print(f"Expy Kit: could not read preset {preset}: {e}")
+
+        table = ConversionTable.build(skeletons, sources, choices)
+        try:
+            table.save(table_path)
+        except OSError as e:
+            print(f"Expy Kit: could not save conversion table: {e}")
+
+    _CONVERSION_TABLE = table
+    return table
+
+
+def _iterate_preset_ids(preset_files):
+    retarget_dir = get_retarget_dir()
+    for filename in sorted(preset_files):
+        try:
+            preset_names = list(load_preset_file(os.path.join(retarget_dir, filename)))
+        except Exception as e:
+            print(f"Expy Kit: could not read preset {filename}: {e}")
+            continue
+
+        for name in preset_names:
+            yield PRESET_NAME_SEPARATOR.join((filename, name)) if name else filename
+
+
+def get_table_map(src_preset, trg_preset, src_index=None, trg_index=None, src_bones=None, trg_bones=None):
+    """Return the conversion map of two presets from the conversion table, None if it can't be used.
+
+    Presets look up their optional bones in the bones of their armature, src_bones and trg_bones,
+    by default those of the active object: the table is used only if they are all found.
+    Given the NameIndex of an armature, its bone names are resolved as preset validation would,
+    and bones not found are left out
+    """
+    table = get_conversion_table()
+    bone_map = table.get(src_preset, trg_preset)
+    if bone_map is None:
+        return None
+
+    active_bones = bpy.context.object.data.bones if bpy.context.object else ()
+    for preset, bones in ((src_preset, src_bones), (trg_preset, trg_bones)):
+        if bones is None:
+            bones = active_bones
+        if not all(bone_name in bones for bone_name in table.choices.get(preset, ())):
+            return None
+
+    if src_index is None and trg_index is None:
+        return bone_map
+
+    src_root = table.roots.get(src_preset)
+    resolved = {}
+    for preset_name, trg_name in bone_map.items():
+        src_name = src_index.resolve(preset_name) if src_index is not None else preset_name
+        if not src_name:
+            continue
+
+        if trg_index is not None:
+            trg_name = trg_index.resolve(trg_name)
+            # the root is mapped even without a target root, to be bound to the target object
+            if not trg_name and preset_name != src_root:
+                continue
+
+        resolved[src_name] = trg_name
+
+    return resolved
+
+
 def reset_preset_names(settings):
     "Reset preset names used by scripts"
     settings.right_arm.name = 'arm'
@@ -184,41 +1041,23 @@ class PresetFinger:
 class PresetCustom:
     def __init__(self):
         self.name = ""
-        # We don't need to define custom properties here since 
-        # they will be added dynamically in the copy method
-    
-    def __setattr__(self, key, value):
-        self.__dict__[key] = value
-    
-    def __getattr__(self, key):
-        # Return empty string for non-existent attributes
-        if key not in self.__dict__:
-            return ""
-        return self.__dict__[key]
-    
+        self.bones = {}  # {identifier: bone name}, in order of addition
+
     def add_bone(self, identifier, bone_name):
-        """Add a custom bone property with the given identifier"""
-        if hasattr(self, identifier):
-            # Property already exists, update it
-            setattr(self, identifier, bone_name)
-        else:
-            # Create a new property
-            prop = StringProperty(name=identifier, default=bone_name)
-            setattr(self.__class__, identifier, prop)
-            setattr(self, identifier, bone_name)
+        """Set the bone of the given identifier"""
+        self.bones[identifier] = bone_name
         return True
-    
+
+    def remove_bone(self, identifier):
+        return self.bones.pop(identifier, None) is not None
+
+    def clear_bones(self):
+        self.bones.clear()
+
     def get_bones(self):
-        """Get all custom bone properties as (identifier, bone_name) pairs"""
-        result = []
-        for prop_name in dir(self):
-            if prop_name.startswith('__') or prop_name in ('name', 'add_bone', 'get_bones', 'has_settings'):
-                continue
-            value = getattr(self, prop_name)
-            if isinstance(value, str) and value:
-                result.append((prop_name, value))
-        return result
-    
+        """Get all custom bones as (identifier, bone_name) pairs"""
+        return [(identifier, bone_name) for identifier, bone_name in self.bones.items() if bone_name]
+
     def has_settings(self):
         """Check if any custom bones are defined"""
         return bool(self.get_bones()) or bool(self.name)
@@ -252,13 +1091,9 @@ class PresetSkeleton:
             for k in setting.keys():
                 setattr(setting, k, getattr(trg_setting, k))
 
-        # Copy custom bones - we need to handle dynamic properties
         self.custom.name = settings.custom.name
-        
-        # Copy all custom bone properties
-        if hasattr(settings.custom, 'get_bones'):
-            for identifier, bone_name in settings.custom.get_bones():
-                setattr(self.custom, identifier, bone_name)
+        for identifier, bone_name in settings.custom.get_bones():
+            self.custom.add_bone(identifier, bone_name)
 
         # Copy root bone
         self.root = settings.root
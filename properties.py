@@ -5,10 +5,16 @@ from bpy.props import PointerProperty
 from bpy.props import BoolProperty
 from bpy.props import EnumProperty
 from bpy.props import CollectionProperty
+from bpy.app.handlers import persistent
 
 from . import preset_handler
 
 
+def _settings_update(self, context):
+    # also called when settings are set from scripts, in background mode too
+    preset_handler.invalidate_settings_snapshots()
+
+
 class RetargetBase(PropertyGroup):
     def has_settings(self):
         for k, v in self.items():
@@ -20,91 +26,93 @@ class RetargetBase(PropertyGroup):
 
 
 class RetargetSpine(RetargetBase):
-    head: StringProperty(name="head")
-    neck: StringProperty(name="neck")
-    spine2: StringProperty(name="spine2")
-    spine1: StringProperty(name="spine1")
-    spine: StringProperty(name="spine")
-    hips: StringProperty(name="hips")
+    head: StringProperty(name="head", update=_settings_update)
+    neck: StringProperty(name="neck", update=_settings_update)
+    spine2: StringProperty(name="spine2", update=_settings_update)
+    spine1: StringProperty(name="spine1", update=_settings_update)
+    spine: StringProperty(name="spine", update=_settings_update)
+    hips: StringProperty(name="hips", update=_settings_update)
 
 
 class RetargetArm(RetargetBase):
-    shoulder: StringProperty(name="shoulder")
-    arm: StringProperty(name="arm")
-    arm_twist: StringProperty(name="arm_twist")
-    arm_twist_02: StringProperty(name="arm_twist_02")
-    forearm: StringProperty(name="forearm")
-    forearm_twist: StringProperty(name="forearm_twist")
-    forearm_twist_02: StringProperty(name="forearm_twist_02")
-    hand: StringProperty(name="hand")
+    shoulder: StringProperty(name="shoulder", update=_settings_update)
+    arm: StringProperty(name="arm", update=_settings_update)
+    arm_twist: StringProperty(name="arm_twist", update=_settings_update)
+    arm_twist_02: StringProperty(name="arm_twist_02", update=_settings_update)
+    forearm: StringProperty(name="forearm", update=_settings_update)
+    forearm_twist: StringProperty(name="forearm_twist", update=_settings_update)
+    forearm_twist_02: StringProperty(name="forearm_twist_02", update=_settings_update)
+    hand: StringProperty(name="hand", update=_settings_update)
 
-    name: StringProperty(default='arm')
+    name: StringProperty(default='arm', update=_settings_update)
 
 
 class RetargetLeg(RetargetBase):
-    upleg: StringProperty(name="upleg")
-    upleg_twist: StringProperty(name="upleg_twist")
-    upleg_twist_02: StringProperty(name="upleg_twist_02")
-    leg: StringProperty(name="leg")
-    leg_twist: StringProperty(name="leg_twist")
-    leg_twist_02: StringProperty(name="leg_twist_02")
-    foot: StringProperty(name="foot")
-    toe: StringProperty(name="toe")
+    upleg: StringProperty(name="upleg", update=_settings_update)
+    upleg_twist: StringProperty(name="upleg_twist", update=_settings_update)
+    upleg_twist_02: StringProperty(name="upleg_twist_02", update=_settings_update)
+    leg: StringProperty(name="leg", update=_settings_update)
+    leg_twist: StringProperty(name="leg_twist", update=_settings_update)
+    leg_twist_02: StringProperty(name="leg_twist_02", update=_settings_update)
+    foot: StringProperty(name="foot", update=_settings_update)
+    toe: StringProperty(name="toe", update=_settings_update)
 
-    name: StringProperty(default='leg')
+    name: StringProperty(default='leg', update=_settings_update)
 
 
 class RetargetFinger(RetargetBase):
-    meta: StringProperty(name="meta")
-    a: StringProperty(name="A")
-    b: StringProperty(name="B")
-    c: StringProperty(name="C")
+    meta: StringProperty(name="meta", update=_settings_update)
+    a: StringProperty(name="A", update=_settings_update)
+    b: StringProperty(name="B", update=_settings_update)
+    c: StringProperty(name="C", update=_settings_update)
 
 
 class RetargetCustomBone(RetargetBase):
-    name: StringProperty(default='')
-    
+    name: StringProperty(default='', description="Identifier, custom bones with the same identifier are matched",
+                         update=_settings_update)
+    bone_name: StringProperty(name="Bone", update=_settings_update)
+
     def has_settings(self):
-        return bool(self.name)
+        return bool(self.bone_name)
 
 
 class RetargetCustom(RetargetBase):
-    name: StringProperty(default='')
-    
+    name: StringProperty(default='', update=_settings_update)
+    bones: CollectionProperty(type=RetargetCustomBone)
+
     def add_bone(self, identifier, bone_name):
-        """Add a custom bone property with the given identifier"""
-        if hasattr(self, identifier):
-            # Property already exists, update it
-            setattr(self, identifier, bone_name)
-        else:
-            # Create a new property
-            prop = StringProperty(name=identifier, default=bone_name)
-            setattr(self.__class__, identifier, prop)
-            setattr(self, identifier, bone_name)
+        """Set the bone of the custom entry with the given identifier, adding the entry if needed"""
+        entry = self.bones.get(identifier)
+        if entry is None:
+            entry = self.bones.add()
+            entry.name = identifier
+        entry.bone_name = bone_name
+
+        # collection changes are not notified
+        preset_handler.invalidate_settings_snapshots()
         return True
-            
+
     def remove_bone(self, identifier):
-        """Remove a custom bone property with the given identifier"""
-        if hasattr(self, identifier):
-            # Can't actually remove the property, but we can clear its value
-            setattr(self, identifier, "")
-            return True
-        return False
-    
+        """Remove the custom entry with the given identifier"""
+        idx = self.bones.find(identifier)
+        if idx < 0:
+            return False
+
+        self.bones.remove(idx)
+        preset_handler.invalidate_settings_snapshots()
+        return True
+
+    def clear_bones(self):
+        self.bones.clear()
+        preset_handler.invalidate_settings_snapshots()
+
     def get_bones(self):
-        """Get all custom bone properties as (identifier, bone_name) pairs"""
-        result = []
-        for prop_name in dir(self):
-            if prop_name.startswith('__') or prop_name in ('name', 'add_bone', 'remove_bone', 'get_bones', 'has_settings'):
-                continue
-            value = getattr(self, prop_name)
-            if isinstance(value, str) and value:
-                result.append((prop_name, value))
-        return result
-    
+        """Get all custom bones as (identifier, bone_name) pairs"""
+        return [(entry.name, entry.bone_name) for entry in self.bones if entry.bone_name]
+
     def has_settings(self):
         """Check if any custom bones are defined"""
-        return bool(self.get_bones()) or bool(self.name)
+        return bool(self.name) or any(entry.bone_name for entry in self.bones)
 
 
 class RetargetFingers(PropertyGroup):
@@ -114,7 +122,7 @@ class RetargetFingers(PropertyGroup):
     ring: PointerProperty(type=RetargetFinger)
     pinky: PointerProperty(type=RetargetFinger)
 
-    name: StringProperty(default='fingers')
+    name: StringProperty(default='fingers', update=_settings_update)
 
     def has_settings(self):
         for setting in (self.thumb, self.index, self.middle, self.ring, self.pinky):
@@ -125,14 +133,14 @@ class RetargetFingers(PropertyGroup):
 
 
 class RetargetFaceSimple(PropertyGroup):
-    jaw: StringProperty(name="jaw")
-    left_eye: StringProperty(name="left_eye")
-    right_eye: StringProperty(name="right_eye")
+    jaw: StringProperty(name="jaw", update=_settings_update)
+    left_eye: StringProperty(name="left_eye", update=_settings_update)
+    right_eye: StringProperty(name="right_eye", update=_settings_update)
 
-    left_upLid: StringProperty(name="left_upLid")
-    right_upLid: StringProperty(name="right_upLid")
+    left_upLid: StringProperty(name="left_upLid", update=_settings_update)
+    right_upLid: StringProperty(name="right_upLid", update=_settings_update)
 
-    super_copy: BoolProperty(default=True)
+    super_copy: BoolProperty(default=True, update=_settings_update)
 
 
 class RetargetSettings(PropertyGroup):
@@ -154,7 +162,7 @@ class RetargetSettings(PropertyGroup):
 
     custom: PointerProperty(type=RetargetCustom)
 
-    root: StringProperty(name="root")
+    root: StringProperty(name="root", update=_settings_update)
 
     def has_settings(self):
         for setting in (self.spine, self.left_arm, self.left_arm_ik, self.left_fingers,
@@ -169,6 +177,41 @@ class RetargetSettings(PropertyGroup):
     deform_preset: EnumProperty(items=preset_handler.iterate_presets, name="Deformation Bones")
 
 
+def migrate_custom_bones():
+    """Move custom bones saved by older versions, as ID properties of the custom settings, to the bones collection"""
+    for armature in bpy.data.armatures:
+        if armature.library or not getattr(armature, 'is_editable', True):
+            # linked data can't be written, it is migrated in its own file
+            continue
+
+        custom = armature.expykit_retarget.custom
+        for identifier in list(custom.keys()):
+            if identifier in ('name', 'bones'):
+                continue
+
+            bone_name = custom[identifier]
+            if not isinstance(bone_name, str):
+                continue
+            try:
+                if bone_name:
+                    custom.add_bone(identifier, bone_name)
+                del custom[identifier]
+            except Exception as e:
+                print(f"Expy Kit: could not migrate custom bone {identifier} of {armature.name}: {e}")
+
+
+@persistent
+def settings_load_post(*args):
+    migrate_custom_bones()
+    preset_handler.invalidate_settings_snapshots()
+
+
+@persistent
+def settings_undo_post(*args):
+    # undo/redo restore settings without notifications
+    preset_handler.invalidate_settings_snapshots()
+
+
 def register_classes():
     bpy.utils.register_class(RetargetSpine)
     bpy.utils.register_class(RetargetArm)
@@ -183,8 +226,17 @@ def register_classes():
     bpy.types.Armature.expykit_retarget = PointerProperty(type=RetargetSettings)
     bpy.types.Armature.expykit_twist_on = BoolProperty(default=False)
 
+    bpy.app.handlers.load_post.append(settings_load_post)
+    bpy.app.handlers.undo_post.append(settings_undo_post)
+    bpy.app.handlers.redo_post.append(settings_undo_post)
+
 
 def unregister_classes():
+    bpy.app.handlers.redo_post.remove(settings_undo_post)
+    bpy.app.handlers.undo_post.remove(settings_undo_post)
+    bpy.app.handlers.load_post.remove(settings_load_post)
+    preset_handler.invalidate_settings_snapshots()
+
     del bpy.types.Armature.expykit_retarget
     del bpy.types.Armature.expykit_twist_on
 
@@ -194,8 +246,8 @@ def unregister_classes():
     bpy.utils.unregister_class(RetargetFingers)
     bpy.utils.unregister_class(RetargetFinger)
     bpy.utils.unregister_class(RetargetSpine)
-    bpy.utils.unregister_class(RetargetCustomBone)
     bpy.utils.unregister_class(RetargetCustom)
+    bpy.utils.unregister_class(RetargetCustomBone)
 
     bpy.utils.unregister_class(RetargetArm)
     bpy.utils.unregister_class(RetargetLeg)
@@ -1,3 +1,8 @@
+import sys
+from collections import namedtuple
+from functools import lru_cache
+from itertools import chain
+from types import MappingProxyType
 
 
 rigify_face_bones = [
@@ -24,37 +29,95 @@ rigify_face_bones = [
 ]
 
 
+class NameIndex:
+    """Index of bone names, resolving names with or without namespace prefix (i.e. MyCharacter:head)"""
+
+    def __init__(self, bone_names, separator=':'):
+        self.separator = separator
+        bone_names = list(bone_names)
+
+        namespace_count = {}
+        for name in bone_names:
+            if separator in name:
+                namespace = name.rsplit(separator, 1)[0] + separator
+                namespace_count[namespace] = namespace_count.get(namespace, 0) + 1
+
+        # namespaces found in the armature, most used first
+        self.namespaces = sorted(namespace_count, key=namespace_count.get, reverse=True)
+        self._names = frozenset(bone_names)
+
+    def __contains__(self, bone_name):
+        return bool(self.resolve(bone_name))
+
+    def resolve(self, bone_name):
+        """Return the full name of bone_name in the armature, empty string if not found.
+
+        Names without namespace not found are looked up in the most used namespace,
+        i.e. 'Hips' can resolve to 'MyCharacter:Hips'. Names of other namespaces are never remapped
+        """
+        if not bone_name:
+            return ""
+
+        if bone_name in self._names:
+            return bone_name
+
+        if not self.namespaces or self.separator in bone_name:
+            # 'Prop:Hips' is not the same bone as 'MyCharacter:Hips'
+            return ""
+
+        full_name = self.namespaces[0] + bone_name
+        return full_name if full_name in self._names else ""
+
+
 class HumanLimb:
+    """Bone names of a limb, stored in the fixed slots of each limb type.
+
+    bone_slots lists the slots holding bone names. keys() also lists the other settings of the limb
+    """
+    __slots__ = ('name',)
+    bone_slots = ()
+    setting_slots = ()
+
     def __str__(self):
-        return self.__class__.__name__ + ' ' + ', '.join(["{0}: {1}".format(k, v) for k, v in self.__dict__.items()])
+        return self.__class__.__name__ + ' ' + ', '.join(["{0}: {1}".format(k, v) for k, v in self.items()])
 
     def __getitem__(self, item):
         return getattr(self, item, None)
 
     def values(self):
-        return self.__dict__.values()
+        return [getattr(self, k) for k in self.keys()]
 
     def items(self):
-        return self.__dict__.items()
+        return [(k, getattr(self, k)) for k in self.keys()]
 
     def keys(self):
-        return self.__dict__.keys()
+        return self.bone_slots + self.setting_slots
 
     def has_settings(self):
         return bool(self)
 
 
 class SimpleFace(HumanLimb):
-    def __init__(self, jaw='', left_eye='', right_eye=''):
+    bone_slots = ('jaw', 'left_eye', 'right_eye', 'left_upLid', 'right_upLid')
+    setting_slots = ('super_copy',)
+    __slots__ = bone_slots + setting_slots
+
+    def __init__(self, jaw='', left_eye='', right_eye='', left_upLid='', right_upLid=''):
+        self.name = ''
         self.jaw = jaw
         self.left_eye = left_eye
         self.right_eye = right_eye
+        self.left_upLid = left_upLid
+        self.right_upLid = right_upLid
 
         self.super_copy = True
 
 
 class HumanSpine(HumanLimb):
+    __slots__ = bone_slots = ('head', 'neck', 'spine2', 'spine1', 'spine', 'hips')
+
     def __init__(self, head='', neck='', spine2='', spine1='', spine='', hips=''):
+        self.name = ''
         self.head = head
         self.neck = neck
         self.spine2 = spine2
@@ -64,7 +127,11 @@ class HumanSpine(HumanLimb):
 
 
 class HumanArm(HumanLimb):
+    __slots__ = bone_slots = ('shoulder', 'arm', 'arm_twist', 'arm_twist_02',
+                              'forearm', 'forearm_twist', 'forearm_twist_02', 'hand')
+
     def __init__(self, shoulder='', arm='', forearm='', hand=''):
+        self.name = ''
         self.shoulder = shoulder
         self.arm = arm
         self.arm_twist = None
@@ -76,7 +143,11 @@ class HumanArm(HumanLimb):
 
 
 class HumanLeg(HumanLimb):
+    __slots__ = bone_slots = ('upleg', 'upleg_twist', 'upleg_twist_02',
+                              'leg', 'leg_twist', 'leg_twist_02', 'foot', 'toe')
+
     def __init__(self, upleg='', leg='', foot='', toe=''):
+        self.name = ''
         self.upleg = upleg
         self.upleg_twist = None
         self.upleg_twist_02 = None
@@ -87,20 +158,32 @@ class HumanLeg(HumanLimb):
         self.toe = toe
 
 
+FINGER_BONES = ('a', 'b', 'c', 'meta')
+
+
+def _finger_bones(bone_names):
+    """Finger bones as a tuple of (a, b, c, meta), preset fingers are kept as they are"""
+    if not isinstance(bone_names, (list, tuple)):
+        return bone_names
+
+    bone_names = tuple(bone_names[:len(FINGER_BONES)])
+    return bone_names + ('',) * (len(FINGER_BONES) - len(bone_names))
+
+
 class HumanFingers(HumanLimb):
-    def __init__(self, thumb=[''] * 4, index=[''] * 4, middle=[''] * 4, ring=[''] * 4, pinky=[''] * 4, preset=None):
+    __slots__ = bone_slots = ('thumb', 'index', 'middle', 'ring', 'pinky')
+
+    def __init__(self, thumb=('',) * 4, index=('',) * 4, middle=('',) * 4, ring=('',) * 4, pinky=('',) * 4, preset=None):
+        self.name = ''
         if preset:
-            self.thumb = [preset.thumb.a, preset.thumb.b, preset.thumb.c, preset.thumb.meta]
-            self.index = [preset.index.a, preset.index.b, preset.index.c, preset.index.meta]
-            self.middle = [preset.middle.a, preset.middle.b, preset.middle.c, preset.middle.meta]
-            self.ring = [preset.ring.a, preset.ring.b, preset.ring.c, preset.ring.meta]
-            self.pinky = [preset.pinky.a, preset.pinky.b, preset.pinky.c, preset.pinky.meta]
-        else:
-            self.thumb = thumb
-            self.index = index
-            self.middle = middle
-            self.ring = ring
-            self.pinky = pinky
+            thumb, index, middle, ring, pinky = ([getattr(getattr(preset, finger), bone) for bone in FINGER_BONES]
+                                                 for finger in self.bone_slots)
+
+        self.thumb = _finger_bones(thumb)
+        self.index = _finger_bones(index)
+        self.middle = _finger_bones(middle)
+        self.ring = _finger_bones(ring)
+        self.pinky = _finger_bones(pinky)
 
 
 class HumanSkeleton:
@@ -252,140 +335,128 @@ class HumanSkeleton:
         # Legacy support for single custom bone
         if self.custom and self.custom.name:
             yield self.custom.name
-            
-        # Support for dynamic custom bone properties
+
         if self.custom:
-            for attr_name in dir(self.custom):
-                # Skip methods, special attributes, and the name property
-                if (callable(getattr(self.custom, attr_name)) or 
-                    attr_name.startswith('__') or 
-                    attr_name == 'name'):
-                    continue
-                    
-                bone_name = getattr(self.custom, attr_name)
-                if bone_name and isinstance(bone_name, str):
-                    yield bone_name
+            for identifier, bone_name in self.custom.get_bones():
+                yield bone_name
+
+    def freeze(self):
+        """Return the bone names of the skeleton as a FrozenSkeleton, indexed like SKELETON_SLOTS"""
+        bone_names = [self.root]
+        for group, limb_type in _SLOT_GROUPS:
+            limb = getattr(self, group)
+            if not limb:
+                bone_names.extend([''] * (len(limb_type.bone_slots) * (len(FINGER_BONES) if limb_type is HumanFingers else 1)))
+            elif limb_type is HumanFingers:
+                for finger in limb_type.bone_slots:
+                    bone_names.extend(_finger_bones(list(limb[finger])))
+            else:
+                bone_names.extend(getattr(limb, slot, '') for slot in limb_type.bone_slots)
+
+        return FrozenSkeleton(tuple(sys.intern(name) if name else '' for name in bone_names),
+                              _frozen_custom(self.custom))
 
     def conversion_map(self, target_skeleton, skip_ik=False):
-        """Return a dictionary that maps skeleton bone names to target bone names
+        """Return a read-only mapping of skeleton bone names to target bone names
         >>> rigify = RigifySkeleton()
         >>> rigify.conversion_map(MixamoSkeleton())
         {'DEF-spine.006': 'Head', 'DEF-spine.004': 'Neck', 'DEF-spine.003'...
+
+        Maps are cached by frozen skeletons: callers that alter the result must copy it first
         """
-        bone_map = dict()
+        return _conversion_map(self.freeze(), target_skeleton.freeze(), skip_ik)
 
-        def bone_mapping(attr, limb, bone_name):
-            target_limbs = getattr(target_skeleton, attr, None)
-            if not target_limbs:
-                return
 
-            trg_name = getattr(target_limbs, limb, None)
+CONVERSION_MAP_CACHE_SIZE = 64
 
-            if trg_name:
-                bone_map[bone_name] = trg_name
+_SIDE_LIMBS = ('left_arm', 'right_arm', 'left_leg', 'right_leg')
 
-        if self.root:
-            bone_map[self.root] = target_skeleton.root
+# skeleton groups in conversion order: IK limbs come before FK limbs, so that FK bones take precedence
+_SLOT_GROUPS = (('face', SimpleFace), ('spine', HumanSpine),
+                ('left_arm_ik', HumanArm), ('right_arm_ik', HumanArm), ('left_leg_ik', HumanLeg), ('right_leg_ik', HumanLeg),
+                ('left_arm', HumanArm), ('right_arm', HumanArm), ('left_leg', HumanLeg), ('right_leg', HumanLeg),
+                ('left_fingers', HumanFingers), ('right_fingers', HumanFingers))
 
-        face_map = self.face
-        if face_map:
-            for limb_name, bone_name in face_map.items():
-                if limb_name == "super_copy":
-                    continue
-                bone_mapping('face', limb_name, bone_name)
 
-        for limb_name, bone_name in self.spine.items():
-            bone_mapping('spine', limb_name, bone_name)
-
-        if not skip_ik:
-            if self.left_arm_ik:
-                for limb_name, bone_name in self.left_arm_ik.items():
-                    if bone_name == self.left_arm[limb_name]:
-                        continue
-                    bone_mapping('left_arm_ik', limb_name, bone_name)
-
-            if self.right_arm_ik:
-                for limb_name, bone_name in self.right_arm_ik.items():
-                    if bone_name == self.right_arm[limb_name]:
-                        continue
-                    bone_mapping('right_arm_ik', limb_name, bone_name)
-
-            if self.left_leg_ik:
-                for limb_name, bone_name in self.left_leg_ik.items():
-                    if bone_name == self.left_leg[limb_name]:
-                        continue
-                    bone_mapping('left_leg_ik', limb_name, bone_name)
-
-            if self.right_leg_ik:
-                for limb_name, bone_name in self.right_leg_ik.items():
-                    if bone_name == self.right_leg[limb_name]:
-                        continue
-                    bone_mapping('right_leg_ik', limb_name, bone_name)
+def _enumerate_slots():
+    yield 'root'
+    for group, limb_type in _SLOT_GROUPS:
+        for slot in limb_type.bone_slots:
+            if limb_type is HumanFingers:
+                for i in range(len(FINGER_BONES)):
+                    yield f"{group}.{slot}[{i}]"
+            else:
+                yield f"{group}.{slot}"
 
-        for limb_name, bone_name in self.left_arm.items():
-            bone_mapping('left_arm', limb_name, bone_name)
 
-        for limb_name, bone_name in self.right_arm.items():
-            bone_mapping('right_arm', limb_name, bone_name)
+# every bone slot of a skeleton, i.e. 'spine.head', 'left_arm.hand', 'left_fingers.index[2]'
+SKELETON_SLOTS = tuple(_enumerate_slots())
+_SLOT_INDICES = {slot: i for i, slot in enumerate(SKELETON_SLOTS)}
 
-        for limb_name, bone_name in self.left_leg.items():
-            bone_mapping('left_leg', limb_name, bone_name)
 
-        for limb_name, bone_name in self.right_leg.items():
-            bone_mapping('right_leg', limb_name, bone_name)
-        
-        def fingers_mapping(src_fingers, trg_fingers):
-            for finger, bone_names in src_fingers.items():
-                trg_bone_names = trg_fingers[finger]
-
-                assert len(bone_names) == len(trg_bone_names)
-                for bone, trg_bone in zip(bone_names, trg_bone_names):
-                    bone_map[bone] = trg_bone
-
-        trg_fingers = target_skeleton.left_fingers
-        fingers_mapping(self.left_fingers, trg_fingers)
-
-        trg_fingers = target_skeleton.right_fingers
-        fingers_mapping(self.right_fingers, trg_fingers)
-        
+def _group_range(group):
+    indices = [i for i, slot in enumerate(SKELETON_SLOTS) if slot.startswith(group + '.')]
+    return range(indices[0], indices[-1] + 1)
+
+
+_IK_SLOTS = tuple(zip(chain.from_iterable(_group_range(group + '_ik') for group in _SIDE_LIMBS),
+                      chain.from_iterable(_group_range(group) for group in _SIDE_LIMBS)))
+_HEAD_SLOTS = range(1, _group_range('left_arm_ik')[0])
+_FK_SLOTS = range(_group_range('left_arm')[0], len(SKELETON_SLOTS))
+
+FrozenSkeleton = namedtuple('FrozenSkeleton', ('bones', 'custom'))
+FrozenSkeleton.__doc__ = """Bone names indexed like SKELETON_SLOTS, and (name, ((identifier, bone name), ...)) of custom bones"""
+
+
+def _frozen_custom(custom):
+    """Return (name, ((identifier, bone name), ...)) of custom bones"""
+    if not custom:
+        return None
+
+    return custom.name, tuple(custom.get_bones())
+
+
+@lru_cache(maxsize=CONVERSION_MAP_CACHE_SIZE)
+def _conversion_map(source, target, skip_ik):
+    src_bones = source.bones
+    trg_bones = target.bones
+
+    bone_map = dict()
+    if src_bones[0]:
+        bone_map[src_bones[0]] = trg_bones[0]
+
+    # face and spine
+    for i in _HEAD_SLOTS:
+        if src_bones[i] and trg_bones[i]:
+            bone_map[src_bones[i]] = trg_bones[i]
+
+    if not skip_ik:
+        for i, fk_i in _IK_SLOTS:
+            bone_name = src_bones[i]
+            # IK bones that are the FK bones as well are mapped as FK
+            if bone_name and trg_bones[i] and bone_name != src_bones[fk_i]:
+                bone_map[bone_name] = trg_bones[i]
+
+    # limbs and fingers
+    for i in _FK_SLOTS:
+        if src_bones[i] and trg_bones[i]:
+            bone_map[src_bones[i]] = trg_bones[i]
+
+    if source.custom and target.custom:
+        src_name, src_custom = source.custom
+        trg_name, trg_custom = target.custom
+
         # Legacy support for single custom bone
-        if self.custom and self.custom.name and target_skeleton.custom and target_skeleton.custom.name:
-            bone_map[self.custom.name] = target_skeleton.custom.name
-            
-        # Support for dynamic custom bone properties
-        if self.custom and target_skeleton.custom:
-            # Get all custom bone properties from source and target
-            src_props = {}
-            trg_props = {}
-            
-            # Process source custom properties
-            for attr_name in dir(self.custom):
-                if (callable(getattr(self.custom, attr_name)) or 
-                    attr_name.startswith('__') or 
-                    attr_name == 'name'):
-                    continue
-                
-                bone_name = getattr(self.custom, attr_name)
-                if bone_name and isinstance(bone_name, str):
-                    src_props[attr_name] = bone_name
-            
-            # Process target custom properties
-            for attr_name in dir(target_skeleton.custom):
-                if (callable(getattr(target_skeleton.custom, attr_name)) or 
-                    attr_name.startswith('__') or 
-                    attr_name == 'name'):
-                    continue
-                
-                bone_name = getattr(target_skeleton.custom, attr_name)
-                if bone_name and isinstance(bone_name, str):
-                    trg_props[attr_name] = bone_name
-            
-            # Map source bones to target bones by matching property names
-            for prop_name in src_props:
-                if prop_name in trg_props:
-                    bone_map[src_props[prop_name]] = trg_props[prop_name]
+        if src_name and trg_name:
+            bone_map[src_name] = trg_name
+
+        # Map source bones to target bones by matching property names
+        trg_custom = dict(trg_custom)
+        for identifier, bone_name in src_custom:
+            if identifier in trg_custom:
+                bone_map[bone_name] = trg_custom[identifier]
 
-        return bone_map
+    return MappingProxyType(bone_map)
 
 
 class MixamoSkeleton(HumanSkeleton):
@@ -0,0 +1,143 @@
+"""Conversion maps between skeletons: inversion, composition and a precomputed table of all pairs"""
+
+import json
+from types import MappingProxyType
+
+
+TABLE_VERSION = 1
+MAPPING_VERSION = 1
+
+
+def invert_map(bone_map):
+    """Return the map from target bones back to source bones.
+    When several source bones map to the same target bone, the first one is kept"""
+    inverse = dict()
+    for src_name, trg_name in bone_map.items():
+        if src_name and trg_name:
+            inverse.setdefault(trg_name, src_name)
+
+    return MappingProxyType(inverse)
+
+
+def compose_maps(*bone_maps):
+    """Return the map going through all the given maps in order, i.e. Daz -> Rigify then Rigify -> Unreal.
+    Bones that are lost on the way are left out"""
+    composed = dict(bone_maps[0])
+    for bone_map in bone_maps[1:]:
+        composed = {src_name: bone_map[trg_name] for src_name, trg_name in composed.items()
+                    if trg_name in bone_map and bone_map[trg_name]}
+
+    return MappingProxyType(composed)
+
+
+class ConversionTable:
+    """Conversion maps of every pair of a set of skeletons, i.e. installed presets.
+
+    sources identifies what the table was built from, so that cached tables can be told out of date.
+    choices lists, for skeletons depending on the armature, the bones that were assumed to be found
+    """
+
+    def __init__(self, maps=None, roots=None, sources=None, choices=None):
+        self.maps = maps or {}  # {source name: {target name: {bone: bone}}}
+        self.roots = roots or {}  # {skeleton name: root bone}
+        self.sources = sources or {}
+        self.choices = choices or {}  # {skeleton name: [bone names]}
+
+    @classmethod
+    def build(cls, skeletons, sources=None, choices=None):
+        """Compute the table of {name: skeleton}"""
+        maps = {}
+        for src_name, src_skeleton in skeletons.items():
+            maps[src_name] = {trg_name: MappingProxyType(dict(src_skeleton.conversion_map(trg_skeleton)))
+                              for trg_name, trg_skeleton in skeletons.items()}
+
+        roots = {name: skeleton.root or "" for name, skeleton in skeletons.items()}
+        return cls(maps, roots, sources, choices)
+
+    @classmethod
+    def load(cls, path):
+        """Read a table saved to path. Raise ValueError if it was saved in another format"""
+        with open(path) as table_file:
+            return cls.from_data(json.load(table_file))
+
+    @classmethod
+    def from_data(cls, data):
+        if data.get('version') != TABLE_VERSION:
+            raise ValueError(f"unsupported conversion table version {data.get('version')}")
+
+        maps = {src_name: {trg_name: MappingProxyType(bone_map) for trg_name, bone_map in trg_maps.items()}
+                for src_name, trg_maps in data['maps'].items()}
+        return cls(maps, data['roots'], data['sources'], data['choices'])
+
+    def save(self, path):
+        data = {
+            'version': TABLE_VERSION,
+            'sources': self.sources,
+            'roots': self.roots,
+            'choices': self.choices,
+            'maps': {src_name: {trg_name: dict(bone_map) for trg_name, bone_map in trg_maps.items()}
+                     for src_name, trg_maps in self.maps.items()},
+        }
+        with open(path, 'w') as table_file:
+            json.dump(data, table_file, separators=(',', ':'))
+
+    def __contains__(self, name):
+        return name in self.maps
+
+    def names(self):
+        return list(self.maps)
+
+    def get(self, src_name, trg_name):
+        """Return the map from src_name bones to trg_name bones, None if either is not in the table"""
+        try:
+            return self.maps[src_name][trg_name]
+        except KeyError:
+            return None
+
+    def path_map(self, *names):
+        """Return the map from the first to the last skeleton, going through the ones in between,
+        i.e. path_map('Daz_Genesis_8.py', 'Rigify_Deform.py', 'Unreal_Mannequin_5_0.py')"""
+        bone_maps = [self.get(src_name, trg_name) for src_name, trg_name in zip(names, names[1:])]
+        if None in bone_maps:
+            return None
+
+        return compose_maps(*bone_maps)
+
+    def inverse(self, src_name, trg_name):
+        """Return the map from trg_name bones back to src_name bones"""
+        bone_map = self.get(src_name, trg_name)
+        if bone_map is None:
+            return None
+
+        return invert_map(bone_map)
+
+
+def save_mapping(path, bone_map, source="", target=""):
+    """Write a single conversion map, i.e. to be applied in other applications"""
+    data = {
+        'version': MAPPING_VERSION,
+        'source': source,
+        'target': target,
+        'map': dict(bone_map),
+    }
+    with open(path, 'w') as mapping_file:
+        json.dump(data, mapping_file, indent=2)
+
+
+def load_mapping(path, *names):
+    """Return the conversion map saved to path, either by save_mapping or as a ConversionTable.
+    Tables need the names of the skeletons to go through, see ConversionTable.path_map"""
+    with open(path) as mapping_file:
+        data = json.load(mapping_file)
+
+    if 'maps' in data:
+        table = ConversionTable.from_data(data)
+        bone_map = table.path_map(*names) if len(names) > 1 else None
+        if bone_map is None:
+            raise KeyError(f"no conversion between {', '.join(names)} in {path}")
+        return bone_map
+
+    if data.get('version') != MAPPING_VERSION:
+        raise ValueError(f"unsupported mapping version {data.get('version')}")
+
+    return MappingProxyType(data['map'])
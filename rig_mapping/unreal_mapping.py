@@ -1,30 +1,118 @@
+"""Apply Expy Kit bone maps to Unreal NodeMappingContainer assets.
+
+Run from the editor with the containers selected, or from the command line over a content folder:
+
+    UnrealEditor-Cmd.exe Project.uproject -run=pythonscript -script="unreal_mapping.py --mapping unreal_to_rigify.json --folder /Game/Retarget --save"
+"""
+
+import argparse
+import shlex
+import sys
+
 import unreal
 try:
     from . import bone_mapping
+    from . import mapping_graph
 except ImportError:
-    import sys
     import os
     parent_path = os.path.dirname(__file__)
     if parent_path not in sys.path:
         sys.path.append(parent_path)
     import bone_mapping
+    import mapping_graph
+
+
+CONTAINER_CLASS = "NodeMappingContainer"
+TRANSACTION_NAME = "Expy Kit Bone Mapping"
+
+
+def convert_bone_map(rig_map):
+    """Return the map with Blender names turned into valid Unreal names"""
+    return {k: v.replace(".", "_") for k, v in rig_map.items()}
+
+
+def default_bone_map():
+    """Return the map from the Unreal Mannequin to Rigify, used when no mapping is given"""
+    return bone_mapping.UnrealSkeleton().conversion_map(bone_mapping.RigifySkeleton())
+
+
+def apply_bone_mapping(containers, rig_map):
+    """Set rig_map on all the containers, as a single undo step. Return the number of containers"""
+    rig_map = convert_bone_map(rig_map)
+
+    count = 0
+    with unreal.ScopedEditorTransaction(TRANSACTION_NAME):
+        for container in containers:
+            container.modify()
+            container.set_editor_property('source_to_target', rig_map)
+            count += 1
 
+    return count
 
-def add_bone_mapping(container, source=bone_mapping.UnrealSkeleton(), target=bone_mapping.RigifySkeleton()):
-    rig_map = source.conversion_map(target)
-    for k, v in rig_map.items():
-        rig_map[k] = v.replace(".", "_")
 
-    container.set_editor_property('source_to_target', rig_map)
+def _asset_class_name(asset_data):
+    try:
+        # UE 5.1 and later
+        return str(asset_data.asset_class_path.asset_name)
+    except AttributeError:
+        return str(asset_data.asset_class)
 
 
-def map_selected():
-    assets = unreal.EditorUtilityLibrary.get_selected_assets()
-    for asset in assets:
-        if asset.get_class().get_name() != "NodeMappingContainer":
+def iterate_selected_containers():
+    for asset in unreal.EditorUtilityLibrary.get_selected_assets():
+        if asset.get_class().get_name() == CONTAINER_CLASS:
+            yield asset
+
+
+def iterate_folder_containers(folder):
+    """Yield the mapping containers found in folder and its subfolders, i.e. /Game/Characters"""
+    for asset_path in unreal.EditorAssetLibrary.list_assets(folder, recursive=True, include_folder=False):
+        asset_data = unreal.EditorAssetLibrary.find_asset_data(asset_path)
+        if _asset_class_name(asset_data) != CONTAINER_CLASS:
             continue
-        add_bone_mapping(asset)
+
+        yield unreal.EditorAssetLibrary.load_asset(asset_path)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Set the bone mapping of NodeMappingContainer assets")
+    parser.add_argument('--mapping',
+                        help="Mapping exported from Expy Kit, or its conversion table")
+    parser.add_argument('--preset', action='append', default=[],
+                        help="Presets to go through when --mapping is a conversion table, in order")
+    parser.add_argument('--folder', action='append', default=[],
+                        help="Content folder to search for containers, instead of the selection")
+    parser.add_argument('--save', action='store_true',
+                        help="Save the modified containers")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+        if len(argv) == 1:
+            # -run=pythonscript -script="unreal_mapping.py ..." passes the arguments as one string
+            argv = shlex.split(argv[0])
+
+    args = parse_args(argv)
+
+    if args.mapping:
+        rig_map = mapping_graph.load_mapping(args.mapping, *args.preset)
+    else:
+        rig_map = default_bone_map()
+
+    if args.folder:
+        containers = [container for folder in args.folder for container in iterate_folder_containers(folder)]
+    else:
+        containers = list(iterate_selected_containers())
+
+    count = apply_bone_mapping(containers, rig_map)
+    unreal.log(f"Expy Kit: bone mapping set on {count} containers")
+
+    if args.save and containers:
+        unreal.EditorAssetLibrary.save_loaded_assets(containers, only_if_is_dirty=True)
 
 
 if __name__ == "__main__":
-    map_selected()
+    main()
@@ -0,0 +1,20 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# bone_mapping and mapping_graph don't need Blender, they are imported as standalone modules
+sys.path.append(os.path.join(ADDON_DIR, "rig_mapping"))
+
+
+@pytest.fixture(scope='session')
+def expykit():
+    """The Expy Kit package, only available when running in Blender's python"""
+    pytest.importorskip('bpy')
+
+    sys.path.append(os.path.dirname(ADDON_DIR))
+    return importlib.import_module(os.path.basename(ADDON_DIR))
@@ -0,0 +1,35 @@
+from bone_mapping import NameIndex
+
+
+def test_exact_name():
+    index = NameIndex(['mixamorig:Hips', 'mixamorig:Spine', 'Hips'])
+    assert index.resolve('Hips') == 'Hips'
+    assert index.resolve('mixamorig:Spine') == 'mixamorig:Spine'
+
+
+def test_name_without_namespace():
+    index = NameIndex(['mixamorig:Hips', 'mixamorig:Spine', 'prop:Root'])
+    assert index.resolve('Spine') == 'mixamorig:Spine'
+    assert index.resolve('Root') == ''
+    assert 'Hips' in index
+    assert 'Head' not in index
+
+
+def test_name_of_other_namespace():
+    index = NameIndex(['mixamorig:Hips', 'mixamorig:Spine', 'prop:Hips'])
+    assert index.resolve('prop:Hips') == 'prop:Hips'
+    assert index.resolve('prop:Spine') == ''
+    assert index.resolve('other:Spine') == ''
+
+
+def test_name_of_other_prefix():
+    index = NameIndex(['Right_Hand', 'Right_Foot', 'Right_Toe', 'Left_Hand', 'Left_Foot'], '_')
+    assert index.resolve('Left_Toe') == ''
+    assert index.resolve('Toe') == 'Right_Toe'
+
+
+def test_no_namespace():
+    index = NameIndex(['Hips', 'Spine'])
+    assert index.resolve('Spine') == 'Spine'
+    assert index.resolve('mixamorig:Spine') == ''
+    assert index.resolve('') == ''
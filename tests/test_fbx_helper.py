@@ -0,0 +1,131 @@
+import importlib
+import struct
+
+import pytest
+
+
+FBX_HEADER = b'Kaydara FBX Binary  \x00\x1a\x00'
+
+
+@pytest.fixture
+def fbx_helper(expykit):
+    pytest.importorskip('io_scene_fbx')
+    return importlib.import_module(expykit.__name__ + '.fbx_helper')
+
+
+def encode_prop(value):
+    if isinstance(value, bytes):
+        return b'S' + struct.pack('<I', len(value)) + value
+    if isinstance(value, bool):
+        return b'C' + struct.pack('<?', value)
+    if isinstance(value, int):
+        return b'L' + struct.pack('<q', value)
+    if isinstance(value, float):
+        return b'D' + struct.pack('<d', value)
+
+    # array of doubles
+    data = struct.pack(f'<{len(value)}d', *value)
+    return b'd' + struct.pack('<3I', len(value), 0, len(data)) + data
+
+
+def encode_records(records, offset, version):
+    """Return the binary FBX records, given as (name, properties, nested records), written at offset"""
+    header = struct.Struct('<3QB' if version >= 7500 else '<3IB')
+
+    data = b''
+    for name, props, nested in records:
+        props_data = b''.join(encode_prop(prop) for prop in props)
+        nested_offset = offset + len(data) + header.size + len(name) + len(props_data)
+        nested_data = b''
+        if nested:
+            # nested records are closed by a null record
+            nested_data = encode_records(nested, nested_offset, version) + b'\x00' * header.size
+
+        record_end = nested_offset + len(nested_data)
+        data += header.pack(record_end, len(props), len(props_data), len(name)) + name + props_data + nested_data
+
+    return data
+
+
+def write_fbx(path, records, version):
+    header = FBX_HEADER + struct.pack('<I', version)
+    path.write_bytes(header + encode_records(records, len(header), version) + b'\x00' * 100)
+    return str(path)
+
+
+def model(name, model_type):
+    return b'Model', [len(name), name + b'\x00\x01Model', model_type], []
+
+
+@pytest.mark.parametrize('version', [7400, 7500])
+def test_iterate_records(fbx_helper, tmp_path, version):
+    records = [
+        (b'FBXHeaderExtension', [], [(b'FBXVersion', [version], [])]),
+        (b'Objects', [], [(b'Geometry', [1, b'Body', (0.0, 1.0, 2.0)], []), model(b'Hips', b'LimbNode')]),
+        (b'Connections', [], []),
+    ]
+    path = write_fbx(tmp_path / "test.fbx", records, version)
+
+    with open(path, 'rb') as fbx_file:
+        assert fbx_helper._read_fbx_version(fbx_file) == version
+
+        names = []
+        for name, num_props, props_end, record_end in fbx_helper._iterate_fbx_records(fbx_file, version):
+            names.append(name)
+            if name != b'Objects':
+                continue
+
+            fbx_file.seek(props_end)
+            objects = list(fbx_helper._iterate_fbx_records(fbx_file, version, record_end))
+            assert [obj[0] for obj in objects] == [b'Geometry', b'Model']
+            assert objects[0][1] == 3
+
+    assert names == [b'FBXHeaderExtension', b'Objects', b'Connections']
+
+
+def test_read_props(fbx_helper, tmp_path):
+    records = [(b'Geometry', [1, b'Body', (0.0, 1.0, 2.0), 2.5, True], [])]
+    path = write_fbx(tmp_path / "test.fbx", records, 7400)
+
+    with open(path, 'rb') as fbx_file:
+        version = fbx_helper._read_fbx_version(fbx_file)
+        for _, num_props, props_end, _ in fbx_helper._iterate_fbx_records(fbx_file, version):
+            # arrays are skipped
+            assert fbx_helper._read_fbx_props(fbx_file, num_props) == [1, b'Body', None, 2.5, True]
+            assert fbx_file.tell() == props_end
+
+
+def test_bone_names(fbx_helper, tmp_path):
+    records = [(b'Objects', [], [model(b'Body', b'Mesh'), model(b'Hips', b'LimbNode'), model(b'Spine', b'LimbNode')])]
+    path = write_fbx(tmp_path / "test.fbx", records, 7500)
+
+    assert fbx_helper.get_fbx_bone_names(path) == ['Hips', 'Spine']
+
+
+def test_take_info(fbx_helper, tmp_path):
+    frame_rate, time_mode = next((rate, mode) for rate, mode in fbx_helper.FBX_FRAMERATES if rate > 0)
+    records = [
+        (b'GlobalSettings', [], [(b'Properties70', [], [
+            (b'P', [b'TimeMode', b'enum', b'', b'', time_mode], []),
+        ])]),
+        (b'Objects', [], [model(b'Hips', b'LimbNode')]),
+        (b'Takes', [], [
+            (b'Current', [b'Run'], []),
+            (b'Take', [b'Walk'], [(b'FileName', [b'Walk.tak'], []), (b'ReferenceTime', [0, 1000], [])]),
+            (b'Take', [b'Run'], [(b'LocalTime', [0, 500], [])]),
+        ]),
+    ]
+    path = write_fbx(tmp_path / "test.fbx", records, 7400)
+
+    info = fbx_helper.get_fbx_take_info(path)
+    assert info['frame_rate'] == frame_rate
+    assert info['takes'] == [('Walk', (0, 1000)), ('Run', None)]
+    assert fbx_helper.get_fbx_local_time(path) == (0, 1000)
+
+
+def test_not_binary(fbx_helper, tmp_path):
+    path = tmp_path / "test.fbx"
+    path.write_text("; FBX 7.4.0 project file\n")
+
+    assert fbx_helper.get_fbx_bone_names(str(path)) is None
+    assert fbx_helper.get_fbx_take_info(str(path)) is None
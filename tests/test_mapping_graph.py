@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+import bone_mapping
+import mapping_graph
+
+
+def test_invert_map():
+    inverse = mapping_graph.invert_map({'a': 'x', 'b': 'y', 'c': 'x', 'd': '', '': 'z'})
+    assert dict(inverse) == {'x': 'a', 'y': 'b'}
+
+
+def test_compose_maps():
+    composed = mapping_graph.compose_maps({'a': 'x', 'b': 'y', 'c': 'z'},
+                                          {'x': 'X', 'y': '', 'w': 'W'},
+                                          {'X': '1'})
+    assert dict(composed) == {'a': '1'}
+
+
+def test_compose_single_map():
+    assert dict(mapping_graph.compose_maps({'a': 'x'})) == {'a': 'x'}
+
+
+@pytest.fixture
+def table():
+    skeletons = {'Unreal': bone_mapping.UnrealSkeleton(), 'Rigify': bone_mapping.RigifySkeleton(),
+                 'Mixamo': bone_mapping.MixamoSkeleton()}
+    return mapping_graph.ConversionTable.build(skeletons, sources={'presets': {}}, choices={'Rigify': ['root']})
+
+
+def test_table_maps(table):
+    assert 'Unreal' in table
+    assert table.get('Unreal', 'Nope') is None
+    assert dict(table.get('Unreal', 'Rigify')) == dict(bone_mapping.UnrealSkeleton().conversion_map(
+        bone_mapping.RigifySkeleton()))
+
+    path_map = table.path_map('Unreal', 'Rigify', 'Mixamo')
+    assert path_map
+    assert dict(path_map) == dict(mapping_graph.compose_maps(table.get('Unreal', 'Rigify'), table.get('Rigify', 'Mixamo')))
+    assert table.path_map('Unreal', 'Nope', 'Mixamo') is None
+
+    assert dict(table.inverse('Unreal', 'Rigify')) == dict(mapping_graph.invert_map(table.get('Unreal', 'Rigify')))
+
+
+def test_table_round_trip(table, tmp_path):
+    path = str(tmp_path / "table.json")
+    table.save(path)
+
+    loaded = mapping_graph.ConversionTable.load(path)
+    assert loaded.sources == table.sources
+    assert loaded.roots == table.roots
+    assert loaded.choices == table.choices
+    assert sorted(loaded.names()) == sorted(table.names())
+    for src_name in table.names():
+        for trg_name in table.names():
+            assert dict(loaded.get(src_name, trg_name)) == dict(table.get(src_name, trg_name))
+
+
+def test_table_version(table, tmp_path):
+    path = tmp_path / "table.json"
+    table.save(str(path))
+
+    data = json.loads(path.read_text())
+    data['version'] = mapping_graph.TABLE_VERSION + 1
+    path.write_text(json.dumps(data))
+    with pytest.raises(ValueError):
+        mapping_graph.ConversionTable.load(str(path))
+
+
+def test_load_mapping(table, tmp_path):
+    mapping_path = str(tmp_path / "mapping.json")
+    mapping_graph.save_mapping(mapping_path, {'a': 'x'}, "Source", "Target")
+    assert dict(mapping_graph.load_mapping(mapping_path)) == {'a': 'x'}
+
+    table_path = str(tmp_path / "table.json")
+    table.save(table_path)
+    assert dict(mapping_graph.load_mapping(table_path, 'Unreal', 'Rigify')) == dict(table.get('Unreal', 'Rigify'))
+    with pytest.raises(KeyError):
+        mapping_graph.load_mapping(table_path, 'Unreal')
@@ -0,0 +1,181 @@
+import json
+import pathlib
+
+import pytest
+
+
+PRESETS_DIR = pathlib.Path(__file__).parent.parent / "rig_mapping" / "presets"
+
+class Bones(set):
+    """Bone names of an armature, as found in Armature.bones"""
+
+    class ID:
+        def __init__(self, pointer):
+            self.pointer = pointer
+
+        def as_pointer(self):
+            return self.pointer
+
+    def __init__(self, names, pointer=1):
+        super().__init__(names)
+        self.id_data = self.ID(pointer)
+
+
+@pytest.fixture
+def preset_handler(expykit):
+    return expykit.preset_handler
+
+
+def test_pattern_combinations(preset_handler):
+    pattern = preset_handler.BonePattern("{side}_fingers.{finger}.{segment}", "f_{finger}.{i:02d}.{suffix}",
+                                         {"side, suffix": [["left", "L"], ["right", "R"]],
+                                          "finger": ["index", "middle"],
+                                          "segment, i": [["a", 1], ["b", 2]]})
+    assert not pattern.is_chain()
+
+    expanded = pattern.expand()
+    assert len(expanded) == 8
+    assert expanded[0] == (('left_fingers', 'index', 'a'), 'f_index.01.L')
+    assert (('right_fingers', 'middle', 'b'), 'f_middle.02.R') in expanded
+
+
+def test_pattern_range(preset_handler):
+    pattern = preset_handler.BonePattern("custom.bones.r{i}", "R{i}", {"i": {"start": 1, "stop": 6, "step": 2}})
+    assert pattern.expand() == ((('custom', 'bones', 'r1'), 'R1'),
+                                (('custom', 'bones', 'r3'), 'R3'),
+                                (('custom', 'bones', 'r5'), 'R5'))
+
+
+def test_pattern_chain(preset_handler):
+    pattern = preset_handler.BonePattern("custom.bones.tail_{i}", "tail.{i:03d}", {"i": {"start": 1}})
+    assert pattern.is_chain()
+
+    bones = Bones(['tail.001', 'tail.002', 'tail.004'])
+    assert [bone_name for _, bone_name in pattern.expand(bones)] == ['tail.001', 'tail.002']
+    assert pattern.expand(Bones([])) == ()
+
+
+def test_pattern_chain_cache(preset_handler):
+    pattern = preset_handler.BonePattern("custom.bones.tail_{i}", "tail.{i}", {"i": {"start": 1}})
+
+    bones = Bones(['tail.1', 'tail.2'])
+    assert len(pattern.expand(bones)) == 2
+
+    # same armature, longer chain
+    bones.add('tail.3')
+    assert len(pattern.expand(bones)) == 3
+
+    # same armature, renamed bone
+    bones.discard('tail.2')
+    assert len(pattern.expand(bones)) == 1
+
+    # other armature at the same address
+    assert len(pattern.expand(Bones(['tail.1', 'tail.2']))) == 2
+
+
+def test_pattern_errors(preset_handler):
+    with pytest.raises(ValueError):
+        preset_handler.BonePattern("a.b{i}{j}", "b{i}{j}", {"i": {"start": 0}, "j": {"start": 0}})
+    with pytest.raises(ValueError):
+        preset_handler.BonePattern("a.b{i}", "b{i}", {"i": {"start": 0, "step": 0}})
+    with pytest.raises(ValueError):
+        preset_handler.BonePattern("a.b{i}", "b{i}", {"i": {"start": 0, "stop": 4, "step": 0}})
+
+
+PRESET_SCRIPT = """import bpy
+skeleton = bpy.context.object.data.expykit_retarget
+
+skeleton.spine.hips = 'Hips'
+skeleton.spine.head = 'Head'
+skeleton.left_leg.toe = 'toe.L' if 'toe.L' in bpy.context.object.data.bones else 'toe_fk.L'
+skeleton.left_fingers.index.a = 'index_01.L'
+skeleton.face.super_copy = False
+skeleton.custom.tail = 'Tail'
+skeleton.custom.bones.clear()
+item_sub_1 = skeleton.custom.bones.add()
+item_sub_1.name = 'weapon'
+item_sub_1.bone_name = 'Weapon'
+skeleton.root = 'root'
+"""
+
+
+def get_settings(preset_handler, preset, bones=()):
+    """Return the settings set by a preset, as sorted (attribute path, value)"""
+    skeleton = preset_handler.PresetSkeleton()
+    preset.apply(skeleton, bones=bones)
+    return sorted(preset_handler.get_settings_snapshot(skeleton).assignments, key=repr)
+
+
+def test_script_preset(preset_handler, tmp_path):
+    path = tmp_path / "preset.py"
+    path.write_text(PRESET_SCRIPT)
+
+    preset = preset_handler.CompiledPreset.from_script(str(path))
+    assert preset.code is None
+    assert preset.choice_bones() == {'toe.L'}
+
+    skeleton = preset_handler.PresetSkeleton()
+    preset.apply(skeleton, bones={'toe.L'})
+    assert skeleton.spine.hips == 'Hips'
+    assert skeleton.left_leg.toe == 'toe.L'
+    assert skeleton.left_fingers.index.a == 'index_01.L'
+    assert skeleton.face.super_copy is False
+    assert skeleton.root == 'root'
+    # custom bones of older presets are moved to the custom bone entries
+    assert skeleton.custom.get_bones() == [('weapon', 'Weapon'), ('tail', 'Tail')]
+
+    skeleton = preset_handler.PresetSkeleton()
+    preset.apply(skeleton, bones=())
+    assert skeleton.left_leg.toe == 'toe_fk.L'
+
+
+def test_script_round_trip(preset_handler, tmp_path):
+    path = tmp_path / "preset.py"
+    path.write_text(PRESET_SCRIPT)
+    preset = preset_handler.CompiledPreset.from_script(str(path))
+
+    loaded = preset_handler.CompiledPreset.from_dict(json.loads(json.dumps(preset.to_dict())))
+    for bones in (), {'toe.L'}:
+        assert get_settings(preset_handler, loaded, bones) == get_settings(preset_handler, preset, bones)
+
+
+def test_installed_presets_round_trip(preset_handler):
+    for path in sorted(PRESETS_DIR.glob("*.py")):
+        preset = preset_handler.CompiledPreset.from_script(str(path))
+        if preset.code:
+            continue
+
+        loaded = preset_handler.CompiledPreset.from_dict(json.loads(json.dumps(preset.to_dict())))
+        bones = preset.choice_bones()
+        assert get_settings(preset_handler, loaded, bones) == get_settings(preset_handler, preset, bones), path.name
+
+
+def test_script_with_code(preset_handler, tmp_path):
+    path = tmp_path / "preset.py"
+    path.write_text(PRESET_SCRIPT + "for side in 'left', 'right':\n    pass\n")
+
+    preset = preset_handler.CompiledPreset.from_script(str(path))
+    assert preset.code is not None
+    with pytest.raises(ValueError):
+        preset.to_dict()
+
+
+def test_dict_patterns_round_trip(preset_handler):
+    data = {"spine": {"hips": "DEF-spine"},
+            "custom": {"tail": "DEF-tail"},
+            "patterns": [{"slot": "custom.bones.tail_{i}", "bone": "DEF-tail.{i:03d}", "vars": {"i": {"start": 1}}}]}
+    preset = preset_handler.CompiledPreset.from_dict(data)
+    assert preset.has_chains()
+
+    loaded = preset_handler.CompiledPreset.from_dict(json.loads(json.dumps(preset.to_dict())))
+    bones = Bones(['DEF-tail.001', 'DEF-tail.002'])
+    assert get_settings(preset_handler, loaded, bones) == get_settings(preset_handler, preset, bones)
+
+    skeleton = preset_handler.PresetSkeleton()
+    preset.apply(skeleton, bones=bones)
+    assert skeleton.custom.get_bones() == [('tail', 'DEF-tail'), ('tail_1', 'DEF-tail.001'), ('tail_2', 'DEF-tail.002')]
+
+
+def test_dict_invalid_value(preset_handler):
+    with pytest.raises(ValueError):
+        preset_handler.CompiledPreset.from_dict({"spine": {"hips": 1}})
@@ -1,4 +1,4 @@
-from email.policy import default
+import os
 import typing
 import bpy
 from bpy.props import StringProperty
@@ -8,9 +8,11 @@ from bpy.props import EnumProperty
 from bpy.types import Context, Operator, Menu
 from bl_operators.presets import AddPresetBase
 
+from . import bone_utils
 from . import operators
 from . import preset_handler
 from . import properties
+from .rig_mapping.mapping_graph import save_mapping
 
 
 def menu_header(layout):
@@ -291,6 +293,11 @@ class ExecutePresetArmatureRetarget(Operator):
         description="ID name of the menu this was called from",
         options={'SKIP_SAVE'},
     )
+    preset_name: StringProperty(
+        name="Preset Name",
+        description="Name of the preset in multi-preset .json files",
+        options={'SKIP_SAVE'},
+    )
 
     def execute(self, context):
         from os.path import basename, splitext
@@ -298,20 +305,29 @@ class ExecutePresetArmatureRetarget(Operator):
 
         # change the menu title to the most recently chosen option
         preset_class = VIEW3D_MT_retarget_presets
-        preset_class.bl_label = bpy.path.display_name(basename(filepath), title_case=False)
+        preset_class.bl_label = self.preset_name or bpy.path.display_name(basename(filepath), title_case=False)
 
         ext = splitext(filepath)[1].lower()
 
-        if ext not in {".py", ".xml"}:
+        if ext not in {".py", ".json", ".xml"}:
             self.report({'ERROR'}, "Unknown file type: %r" % ext)
             return {'CANCELLED'}
 
         if hasattr(preset_class, "reset_cb"):
             preset_class.reset_cb(context)
 
-        if ext == ".py":
+        if ext in {".py", ".json"}:
             try:
-                bpy.utils.execfile(filepath)
+                presets = preset_handler.load_preset_file(filepath)
+                if self.preset_name:
+                    preset = presets[self.preset_name]
+                elif len(presets) == 1:
+                    preset, = presets.values()
+                else:
+                    self.report({'ERROR'}, f"{basename(filepath)} holds several presets, pick one in the Rig Type lists")
+                    return {'CANCELLED'}
+
+                preset.apply(context.object.data.expykit_retarget)
             except Exception as ex:
                 self.report({'ERROR'}, "Failed to execute the preset: " + repr(ex))
 
@@ -466,6 +482,35 @@ class SetToActiveBone(Operator):
         return {'FINISHED'}
 
 
+class DetectPresetArmatureRetarget(Operator):
+    """Apply the installed preset that best matches the bones of the armature"""
+    bl_idname = "object.expy_kit_armature_preset_detect"
+    bl_label = "Detect Preset"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    min_score: FloatProperty(name="Minimum Match", default=0.5, min=0.0, max=1.0, subtype='FACTOR',
+                             description="Fraction of the preset bones that must be found in the armature")
+
+    @classmethod
+    def poll(cls, context):
+        return context.object and context.object.type == 'ARMATURE'
+
+    def execute(self, context):
+        scores = preset_handler.score_presets(b.name for b in context.object.data.bones)
+        found, preset = next(((found, preset) for _, found, preset in scores if found >= self.min_score),
+                             (0.0, None))
+        if not preset:
+            self.report({'WARNING'}, "No matching preset found")
+            return {'CANCELLED'}
+
+        filepath, name = preset_handler.get_preset_path(preset)
+        bpy.ops.object.expy_kit_armature_preset_apply(filepath=filepath, preset_name=name,
+                                                      menu_idname=VIEW3D_MT_retarget_presets.__name__)
+
+        self.report({'INFO'}, f"Applied {name or os.path.splitext(preset)[0]} ({found:.0%} bones matching)")
+        return {'FINISHED'}
+
+
 class SetToActiveBoneHelpText(bpy.types.Operator):
     """Show information about the Set to Active Bone functionality"""
     bl_idname = "object.expy_kit_active_bone_help"
@@ -516,27 +561,6 @@ class MirrorSettings(Operator):
 
         return True
 
-    def _is_mirrored_vec(self, trg_head, src_head):
-        epsilon = self.tolerance
-        if abs(trg_head.x + src_head.x) > epsilon:
-            return False
-        if abs(trg_head.y - src_head.y) > epsilon:
-            return False
-        return abs(trg_head.z - src_head.z) < epsilon
-    
-    def _is_mirrored(self, src_bone, trg_bone):
-        if not self._is_mirrored_vec(src_bone.head_local, trg_bone.head_local):
-            return False
-        if not self._is_mirrored_vec(src_bone.tail_local, trg_bone.tail_local):
-            return False
-        
-        return True
-
-    def find_mirrored(self, arm_data, bone):
-        # TODO: should be in bone_utils
-        # TODO: should select best among mirror candidates
-        return next((b for b in arm_data.bones if self._is_mirrored(bone, b)), None)
-
     def execute(self, context):
         if not self.src_setting:
             return {'FINISHED'}
@@ -558,14 +582,19 @@ class MirrorSettings(Operator):
             return {'FINISHED'}
 
         arm_data = context.object.data
+        mirror_index = bone_utils.MirrorIndex(arm_data)
         if 'fingers' in self.trg_setting:
             for finger_name in ('thumb', 'index', 'middle', 'ring', 'pinky'):
                 for attr_name in ('a', 'b', 'c'):
                     bone_name = getattr(getattr(src_grp, finger_name), attr_name)
                     if not bone_name:
                         continue
-                    m_bone = self.find_mirrored(arm_data,
-                                                arm_data.bones[bone_name])
+                    try:
+                        bone = arm_data.bones[bone_name]
+                    except KeyError:
+                        continue
+
+                    m_bone = mirror_index.find(bone, self.tolerance)
                     if not m_bone:
                         continue
 
@@ -582,20 +611,154 @@ class MirrorSettings(Operator):
             except KeyError:
                 continue
 
-            m_bone = self.find_mirrored(arm_data, bone)
+            m_bone = mirror_index.find(bone, self.tolerance)
             if m_bone:
                 setattr(trg_grp, k, m_bone.name)
 
         return {'FINISHED'}
 
 
+class MirrorAllSettings(Operator):
+    """Fill the empty slots of each side with the mirror of the other side"""
+    bl_idname = "object.expy_kit_settings_mirror_all"
+    bl_label = "Auto-Mirror Skeleton Mapping"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    tolerance: FloatProperty(default=0.001)
+
+    @classmethod
+    def poll(cls, context):
+        return MirrorSettings.poll(context)
+
+    @staticmethod
+    def iterate_sided_slots(skeleton):
+        """Yield (left group, right group, slot name) for every sided slot of the settings"""
+        for group_name in ('arm', 'arm_ik', 'leg', 'leg_ik'):
+            left_grp = getattr(skeleton, 'left_' + group_name)
+            right_grp = getattr(skeleton, 'right_' + group_name)
+            for slot in left_grp.bl_rna.properties.keys():
+                if slot in ('rna_type', 'name'):
+                    continue
+                yield left_grp, right_grp, slot
+
+        for finger_name in ('thumb', 'index', 'middle', 'ring', 'pinky'):
+            left_grp = getattr(skeleton.left_fingers, finger_name)
+            right_grp = getattr(skeleton.right_fingers, finger_name)
+            for slot in ('meta', 'a', 'b', 'c'):
+                yield left_grp, right_grp, slot
+
+        for slot in ('eye', 'upLid'):
+            yield skeleton.face, skeleton.face, slot
+
+    def execute(self, context):
+        arm_data = context.object.data
+        skeleton = arm_data.expykit_retarget
+        mirror_index = bone_utils.MirrorIndex(arm_data)
+
+        filled = 0
+        for left_grp, right_grp, slot in self.iterate_sided_slots(skeleton):
+            if left_grp == right_grp:
+                # face slots are prefixed with their side
+                left_slot, right_slot = 'left_' + slot, 'right_' + slot
+            else:
+                left_slot = right_slot = slot
+
+            left_name = getattr(left_grp, left_slot)
+            right_name = getattr(right_grp, right_slot)
+            if bool(left_name) == bool(right_name):
+                continue
+
+            src_name, trg_grp, trg_slot = (left_name, right_grp, right_slot) if left_name else (right_name, left_grp, left_slot)
+            try:
+                bone = arm_data.bones[src_name]
+            except KeyError:
+                continue
+
+            m_bone = mirror_index.find(bone, self.tolerance)
+            if m_bone:
+                setattr(trg_grp, trg_slot, m_bone.name)
+                filled += 1
+
+        self.report({'INFO'}, f"{filled} slots mirrored")
+        return {'FINISHED'}
+
+
 class VIEW3D_MT_retarget_presets(Menu):
     bl_label = "Retarget Presets"
     preset_subdir = AddPresetArmatureRetarget.preset_subdir
     preset_operator = ExecutePresetArmatureRetarget.bl_idname
+    preset_extensions = {".py", ".json"}
     draw = Menu.draw_preset
 
 
+class ConvertPresetsToJson(Operator):
+    """Write all the installed .py presets to a single .json preset file"""
+    bl_idname = "object.expy_kit_presets_to_json"
+    bl_label = "Convert Presets to JSON"
+
+    filepath: StringProperty(subtype='FILE_PATH', options={'SKIP_SAVE'})
+    filter_glob: StringProperty(default="*.json", options={'HIDDEN'})
+
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = "retarget_presets.json"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        filepath = bpy.path.ensure_ext(self.filepath, ".json")
+        retarget_dir = preset_handler.get_retarget_dir()
+        preset_paths = [os.path.join(retarget_dir, f) for f in sorted(os.listdir(retarget_dir)) if f.endswith('.py')]
+
+        skipped = preset_handler.convert_presets(preset_paths, filepath)
+        if skipped:
+            self.report({'WARNING'}, "Presets running code were not converted: "
+                        + ", ".join(os.path.basename(path) for path in skipped))
+        self.report({'INFO'}, f"{len(preset_paths) - len(skipped)} presets written to {filepath}")
+        return {'FINISHED'}
+
+
+class ExportBoneMapping(Operator):
+    """Write the conversion map between two presets to a .json file, i.e. for rig_mapping/unreal_mapping.py"""
+    bl_idname = "object.expy_kit_export_bone_mapping"
+    bl_label = "Export Bone Mapping"
+
+    src_preset: EnumProperty(items=preset_handler.iterate_presets,
+                             name="Source Preset",
+                             )
+
+    trg_preset: EnumProperty(items=preset_handler.iterate_presets,
+                             name="Target Preset",
+                             )
+
+    filepath: StringProperty(subtype='FILE_PATH', options={'SKIP_SAVE'})
+    filter_glob: StringProperty(default="*.json", options={'HIDDEN'})
+
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = "bone_mapping.json"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        filepath = bpy.path.ensure_ext(self.filepath, ".json")
+
+        bone_map = preset_handler.get_conversion_table().get(self.src_preset, self.trg_preset)
+        if bone_map is None:
+            # presets running code are not in the table
+            src_skeleton = preset_handler.get_preset_skel(self.src_preset)
+            trg_skeleton = preset_handler.get_preset_skel(self.trg_preset)
+            if not src_skeleton or not trg_skeleton:
+                self.report({'WARNING'}, "Presets not found")
+                return {'CANCELLED'}
+            bone_map = src_skeleton.conversion_map(trg_skeleton)
+
+        bone_map = {src_name: trg_name for src_name, trg_name in bone_map.items() if src_name and trg_name}
+        save_mapping(filepath, bone_map, self.src_preset, self.trg_preset)
+        self.report({'INFO'}, f"{len(bone_map)} bones written to {filepath}")
+        return {'FINISHED'}
+
+
 class BindFromPanelSelection(bpy.types.Operator):
     """Constrain to armature selected in panel"""
     bl_idname = "object.expy_kit_bind_from_panel"
@@ -710,6 +873,10 @@ class VIEW3D_PT_expy_retarget(RetargetBasePanel, bpy.types.Panel):
         row.operator(AddPresetArmatureRetarget.bl_idname, text="+")
         row.operator(AddPresetArmatureRetarget.bl_idname, text="-").remove_active = True
 
+        row = layout.row()
+        row.operator(DetectPresetArmatureRetarget.bl_idname, icon='VIEWZOOM')
+        row.operator(MirrorAllSettings.bl_idname, icon='MOD_MIRROR')
+
 
 class VIEW3D_PT_expy_retarget_face(RetargetBasePanel, bpy.types.Panel):
     bl_label = "Face"
@@ -938,7 +1105,7 @@ class AddCustomBone(bpy.types.Operator):
     def execute(self, context):
         skeleton = context.active_object.data.expykit_retarget
         if context.active_pose_bone:
-            # Clean the identifier to create a valid property name
+            # Normalize the identifier, custom bones are matched by identifier
             identifier = self.identifier.lower().replace(" ", "_").replace("-", "_")
             
             # Add the custom bone with the given identifier
@@ -990,24 +1157,21 @@ class VIEW3D_PT_expy_retarget_custom(RetargetBasePanel, bpy.types.Panel):
         row = layout.row()
         row.label(text="Custom bones with the same identifier will be matched when binding")
         
-        # Get all custom bones
-        custom_bones = skeleton.custom.get_bones()
-        if custom_bones:
+        if skeleton.custom.bones:
             box = layout.box()
             row = box.row()
             row.label(text="Custom Bones:")
             
-            for identifier, bone_name in custom_bones:
+            for entry in skeleton.custom.bones:
                 row = box.row()
                 split = row.split(factor=0.4)
-                split.label(text=identifier + ":")
+                split.label(text=entry.name + ":")
                 
                 bone_row = split.row(align=True)
-                # We need to dynamically access the property by name
-                bone_row.prop_search(skeleton.custom, identifier, ob.data, "bones", text="")
+                bone_row.prop_search(entry, "bone_name", ob.data, "bones", text="")
                 
                 remove_op = row.operator("object.expy_kit_remove_custom_bone", text="", icon='X')
-                remove_op.identifier = identifier
+                remove_op.identifier = entry.name
 
 
 def register_classes():
@@ -1022,7 +1186,11 @@ def register_classes():
     bpy.utils.register_class(ClearArmatureRetarget)
     bpy.utils.register_class(SetToActiveBone)
     bpy.utils.register_class(SetToActiveBoneHelpText)
+    bpy.utils.register_class(DetectPresetArmatureRetarget)
+    bpy.utils.register_class(ConvertPresetsToJson)
+    bpy.utils.register_class(ExportBoneMapping)
     bpy.utils.register_class(MirrorSettings)
+    bpy.utils.register_class(MirrorAllSettings)
 
     bpy.utils.register_class(AddCustomBone)
     bpy.utils.register_class(RemoveCustomBone)
@@ -1106,6 +1274,10 @@ def unregister_classes():
     bpy.utils.unregister_class(RemoveCustomBone)
     bpy.utils.unregister_class(AddCustomBone)
 
+    bpy.utils.unregister_class(MirrorAllSettings)
+    bpy.utils.unregister_class(ExportBoneMapping)
+    bpy.utils.unregister_class(ConvertPresetsToJson)
+    bpy.utils.unregister_class(DetectPresetArmatureRetarget)
     bpy.utils.unregister_class(MirrorSettings)
     bpy.utils.unregister_class(SetToActiveBone)
     bpy.utils.unregister_class(SetToActiveBoneHelpText)